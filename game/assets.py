@@ -0,0 +1,135 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from os import path, getcwd
+
+import pygame as pg
+
+from game import binmap
+from game.map import Map
+from game.settings import ASSET_LOADER_WORKERS
+
+TEXT_BOX_IMAGE = path.join('assets', 'textBox.png')
+SPRITESHEET_IMAGE = path.join('assets', 'spritesheet.png')
+FONT = path.join('assets', 'fonts', 'Arcon.otf')
+
+
+def map_path(map_name):
+    """
+    Produces the file of the map with the given name, binary maps are preferred over json ones
+    :param map_name: name of the map
+    :return: file name of the map
+    """
+    maps_folder = path.join(getcwd(), 'assets', 'maps')
+    filename = path.join(maps_folder, map_name + binmap.EXTENSION)
+    if not path.exists(filename):
+        filename = path.join(maps_folder, map_name + '.json')
+    return filename
+
+
+def read_bytes(filename):
+    with open(filename, 'rb') as f:
+        return f.read()
+
+
+class AssetLoader:
+    """
+    Loads images, fonts and maps in a pool of background threads
+
+    Files are read and decoded in the pool, the parts that need the display or
+    the font module (converting images, creating fonts) are done on the calling
+    thread when the asset is taken. Taking an asset that was not prefetched loads it on the spot.
+    """
+
+    def __init__(self, workers=ASSET_LOADER_WORKERS):
+        """
+        :param workers: number of loader threads
+        """
+        self.__pool = ThreadPoolExecutor(workers, thread_name_prefix="assets")
+        self.__futures = {}  # (type, file name) -> future of the decoded asset
+        self.__images = {}  # (file name, alpha) -> converted surface
+        self.__fonts = {}  # (file name, size) -> font
+
+    def prefetch_image(self, filename):
+        self.__submit(("image", filename), pg.image.load, filename)
+
+    def prefetch_font(self, filename):
+        self.__submit(("font", filename), read_bytes, filename)
+
+    def prefetch_map(self, map_name):
+        filename = map_path(map_name)
+        self.__submit(("map", filename), Map, filename)
+
+    def prefetch_game(self, map_name):
+        """
+        Starts loading everything a new game on the given map needs
+        :param map_name: name of the first map
+        :return: nothing
+        """
+        self.prefetch_map(map_name)
+        self.prefetch_image(SPRITESHEET_IMAGE)
+        self.prefetch_image(TEXT_BOX_IMAGE)
+        self.prefetch_font(FONT)
+
+    def progress(self):
+        """
+        Produces the number of assets loaded so far
+        :return: (loaded, total) pair
+        """
+        futures = list(self.__futures.values())
+        return sum(future.done() for future in futures), len(futures)
+
+    def done(self):
+        loaded, total = self.progress()
+        return loaded == total
+
+    def image(self, filename, alpha=True):
+        """
+        Produces the image converted to the display format, the surface is shared
+        :param filename: image file
+        :param alpha: true to keep the transparency
+        :return: converted surface
+        """
+        key = (filename, alpha)
+        if key not in self.__images:
+            surface = self.__take(("image", filename), pg.image.load, filename)
+            self.__images[key] = surface.convert_alpha() if alpha else surface.convert()
+        return self.__images[key]
+
+    def font(self, filename, size):
+        """
+        Produces the font of the given size, the font is shared
+        :param filename: font file
+        :param size: height of the font in pixels
+        :return: pygame font
+        """
+        key = (filename, size)
+        if key not in self.__fonts:
+            data = self.__take(("font", filename), read_bytes, filename)
+            self.__fonts[key] = pg.font.Font(io.BytesIO(data), size)
+        return self.__fonts[key]
+
+    def map(self, map_name):
+        """
+        Produces the parsed map, a map is given out once and parsed again when taken again
+        :param map_name: name of the map
+        :return: Map
+        """
+        filename = map_path(map_name)
+        game_map = self.__take(("map", filename), Map, filename)
+        self.__futures.pop(("map", filename), None)
+        return game_map
+
+    def shutdown(self):
+        """
+        Stops the loader threads, the assets not started yet are dropped
+        :return: nothing
+        """
+        self.__pool.shutdown(wait=False, cancel_futures=True)
+
+    def __submit(self, key, func, filename):
+        if key not in self.__futures:
+            self.__futures[key] = self.__pool.submit(func, filename)
+
+    def __take(self, key, func, filename):
+        self.__submit(key, func, filename)
+        return self.__futures[key].result()
@@ -0,0 +1,152 @@
+"""
+Compact binary map format
+
+All numbers are little endian.
+
+    header     magic "CLMP", version u16, reserved u16,
+               width i32, height i32, origin x i32, origin y i32,
+               trigger count u32, string pool size u32
+    tiles      width * height u8 tile ids, indexed [x, y] (x major)
+    triggers   trigger count * (x i32, y i32, width i32, height i32,
+               text offset u32, text length u32)
+    strings    utf-8 string pool referenced by the triggers
+"""
+import mmap
+import struct
+
+import numpy as np
+
+from game import kinds
+
+MAGIC = b"CLMP"
+VERSION = 1
+EXTENSION = ".clmap"
+
+HEADER = struct.Struct("<4sHHiiiiII")
+TRIGGER = struct.Struct("<iiiiII")
+
+# Tile ids, same as the tile numbers of the Tiled tileset where there is one
+EMPTY = 0
+WALL = 1
+APPLE = 2
+DOOR_UP = 3
+DOOR_RIGHT = 4
+DOOR_DOWN = 5
+DOOR_LEFT = 6
+PLAYER = 7
+
+DOOR_DIRS = {DOOR_UP: "up", DOOR_RIGHT: "right", DOOR_DOWN: "down", DOOR_LEFT: "left"}
+DOOR_IDS = {dir: tile_id for tile_id, dir in DOOR_DIRS.items()}
+NAMES = {WALL: "WALL", APPLE: "APPLE", PLAYER: "PLAYER"}
+NAME_IDS = {name: tile_id for tile_id, name in NAMES.items()}
+
+# tile id -> kind and direction of the map object, see game.kinds
+TILE_KINDS = np.array([kinds.NONE, kinds.WALL, kinds.APPLE, kinds.DOOR, kinds.DOOR, kinds.DOOR, kinds.DOOR,
+                       kinds.PLAYER], dtype=np.uint8)
+TILE_DIRS = np.array([kinds.NO_DIRECTION] * 3 +
+                     [kinds.DIRECTIONS.index(DOOR_DIRS[tile_id]) for tile_id in range(DOOR_UP, DOOR_LEFT + 1)] +
+                     [kinds.NO_DIRECTION], dtype=np.int8)
+
+
+def is_binary_map(filename):
+    """
+    Checks whether the file is in the binary map format
+    :param filename: name of the map file
+    :return: true if the file starts with the binary map magic
+    """
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def tile_id_of(node):
+    """
+    Produces the tile id of a map object
+    :param node: map object, like {"x": 0, "y": 0, "name": "DOOR", "dir": "up"}
+    :return: tile id
+    """
+    if node["name"] == "DOOR":
+        return DOOR_IDS[node["dir"]]
+    return NAME_IDS[node["name"]]
+
+
+def write_map(filename, data):
+    """
+    Writes the map in the binary format
+    :param filename: name of the output file
+    :param data: map in the json format, {"objects": [...], "triggers": [...]}
+    :return: nothing
+    """
+    objects = data["objects"]
+    if not objects:
+        raise ValueError("map has no objects")
+
+    xs = [node["x"] for node in objects]
+    ys = [node["y"] for node in objects]
+    origin_x, origin_y = min(xs), min(ys)
+    width, height = max(xs) + 1 - origin_x, max(ys) + 1 - origin_y
+
+    tiles = np.zeros((width, height), dtype=np.uint8)
+    for node in objects:
+        x, y = node["x"] - origin_x, node["y"] - origin_y
+        if tiles[x, y] != EMPTY:
+            raise ValueError("more than one object on the tile ({}, {})".format(node["x"], node["y"]))
+        tiles[x, y] = tile_id_of(node)
+
+    pool = bytearray()
+    trigger_table = bytearray()
+    for trigger in data["triggers"]:
+        text = trigger["text"].encode("utf-8")
+        # Tiled may produce fractional coordinates, truncated the same way pygame.Rect does
+        trigger_table += TRIGGER.pack(int(trigger["x"]), int(trigger["y"]),
+                                      int(trigger["width"]), int(trigger["height"]),
+                                      len(pool), len(text))
+        pool += text
+
+    with open(filename, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, width, height, origin_x, origin_y,
+                            len(data["triggers"]), len(pool)))
+        f.write(tiles.tobytes())
+        f.write(trigger_table)
+        f.write(pool)
+
+
+class BinaryMapData:
+    """
+    Binary map file mapped into memory, tiles are read without creating per tile objects
+    """
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            self.__mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, self.width, self.height, self.origin_x, self.origin_y, \
+            trigger_count, pool_size = HEADER.unpack_from(self.__mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(filename + " is not a binary map")
+        if version != VERSION:
+            raise ValueError("unsupported binary map version " + str(version))
+
+        offset = HEADER.size
+        # [x, y] -> tile id, a read-only view of the mapped file
+        self.tiles = np.frombuffer(self.__mmap, dtype=np.uint8, count=self.width * self.height,
+                                   offset=offset).reshape((self.width, self.height))
+        offset += self.width * self.height
+
+        pool_offset = offset + trigger_count * TRIGGER.size
+        self.triggers = []
+        for i in range(trigger_count):
+            x, y, width, height, text_offset, text_length = TRIGGER.unpack_from(self.__mmap, offset)
+            start = pool_offset + text_offset
+            text = self.__mmap[start:start + text_length].decode("utf-8")
+            self.triggers.append({"x": x, "y": y, "width": width, "height": height, "text": text})
+            offset += TRIGGER.size
+
+    def columns(self):
+        """
+        Produces the map objects as parallel arrays, one entry per non-empty tile
+        :return: (xs, ys, kinds, dirs) arrays
+        """
+        xs, ys = np.nonzero(self.tiles)
+        ids = self.tiles[xs, ys]
+        return ((xs + self.origin_x).astype(np.int32), (ys + self.origin_y).astype(np.int32),
+                TILE_KINDS[ids], TILE_DIRS[ids])
@@ -0,0 +1,43 @@
+from game import kinds
+from items.pickable import Pickable
+from sprites.door import Door
+from sprites.item import Item
+from sprites.player import Player
+
+# kind -> function(game, x, y, dir) creating the entity of that kind
+FACTORIES = {}
+
+# kinds kept in the static tile store instead of being spawned, see game.static_tiles
+STATIC_KINDS = (kinds.WALL,)
+
+# kinds of the items that can be picked up, moved around in saves
+ITEM_KINDS = (kinds.APPLE,)
+
+
+def factory(kind):
+    """
+    Registers the decorated function as the factory of the kind
+    :param kind: kind of the map object, see game.kinds
+    """
+    def register(func):
+        FACTORIES[kind] = func
+        return func
+
+    return register
+
+
+@factory(kinds.APPLE)
+def apple(game, x, y, dir):
+    item = Item(game, x, y, game.images["apple"])
+    item.pickable = Pickable(item, 'apple', False, 1, False)
+    return item
+
+
+@factory(kinds.DOOR)
+def door(game, x, y, dir):
+    return Door(game, x, y, kinds.DIRECTIONS[dir])
+
+
+@factory(kinds.PLAYER)
+def player(game, x, y, dir):
+    return Player(game, x, y)
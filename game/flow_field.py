@@ -0,0 +1,213 @@
+"""
+Distance and steering maps towards one tile, shared by any number of agents
+
+Distances are in steps of ORTHOGONAL_COST along the axes and DIAGONAL_COST along
+the diagonals, which is close to the euclidean length of the way. Moves follow
+the pathfinding rules of game.navigation: 8 directions, no cutting the corner of
+a blocked tile. The field only reaches max_cost from the target, agents further
+away get no direction and can fall back on game.navigation.
+"""
+import numpy as np
+
+from game.grid import TileGrid
+from game.settings import FLOW_FIELD_RANGE
+from misc.instrumentation import stats
+
+ORTHOGONAL_COST = 2
+DIAGONAL_COST = 3
+UNREACHED = np.iinfo(np.int32).max
+
+# direction index -> (dx, dy, cost), the same moves as game.navigation.STEPS
+DIRECTIONS = [(1, 0, ORTHOGONAL_COST), (-1, 0, ORTHOGONAL_COST), (0, 1, ORTHOGONAL_COST), (0, -1, ORTHOGONAL_COST),
+              (1, 1, DIAGONAL_COST), (1, -1, DIAGONAL_COST), (-1, 1, DIAGONAL_COST), (-1, -1, DIAGONAL_COST)]
+NO_DIRECTION = -1
+
+
+class FlowField:
+    """
+    Distances to the target tile and the direction to take on every tile
+
+    The field is recomputed on the first read after the target has moved to
+    another tile or a tile inside the reached area has changed; changes further
+    away are ignored. Only the previously reached area is cleared, so the cost
+    depends on the range and not on the size of the map.
+    """
+
+    def __init__(self, walkable, max_cost=FLOW_FIELD_RANGE * ORTHOGONAL_COST):
+        """
+        :param walkable: TileGrid, True if the tile can be walked on, read on every computation
+        :param max_cost: largest distance reached from the target
+        """
+        self.walkable = walkable
+        self.max_cost = max_cost
+
+        # distances and walkability with a border of unreachable tiles, so that neighbours are never out of the map
+        self.__distances = np.full((walkable.width + 2, walkable.height + 2), UNREACHED, dtype=np.int32)
+        self.__walkable = np.zeros((walkable.width + 2, walkable.height + 2), dtype=np.bool_)
+        self.distances = TileGrid(0, 0)
+        self.distances.data = self.__distances[1:-1, 1:-1]
+        self.directions = TileGrid(walkable.width, walkable.height, NO_DIRECTION, np.int8)
+
+        self.__target = None  # (x, y) of the target tile
+        self.__box = None  # (left, top, right, bottom) around the reached tiles, right and bottom excluded
+        self.__dirty = False
+
+    def set_target(self, tilex, tiley):
+        """
+        Moves the target to the tile
+        :param tilex: x coordinate in tiles
+        :param tiley: y coordinate in tiles
+        :return: nothing
+        """
+        if (tilex, tiley) != self.__target:
+            self.__target = (tilex, tiley)
+            self.__dirty = True
+
+    def tile_changed(self, tilex, tiley):
+        """
+        Tells the field that the walkability of the tile has changed
+        :param tilex: x coordinate in tiles
+        :param tiley: y coordinate in tiles
+        :return: nothing
+        """
+        if self.__box is None:
+            self.__dirty = True
+            return
+        left, top, right, bottom = self.__box
+        # a tile next to the reached area may open a way out of it
+        if left - 1 <= tilex <= right and top - 1 <= tiley <= bottom:
+            self.__dirty = True
+
+    def distance_at(self, tilex, tiley):
+        """
+        Produces the distance from the tile to the target
+        :return: distance, UNREACHED if the target cannot be reached within max_cost
+        """
+        self.refresh()
+        return int(self.distances[tilex, tiley])
+
+    def direction_at(self, tilex, tiley):
+        """
+        Produces the step towards the target
+        :return: (dx, dy), None on the target and where it cannot be reached
+        """
+        self.refresh()
+        direction = self.directions[tilex, tiley]
+        return None if direction == NO_DIRECTION else DIRECTIONS[direction][:2]
+
+    def away_at(self, tilex, tiley):
+        """
+        Produces the step away from the target, for fleeing agents
+        :return: (dx, dy) to the reachable neighbour furthest from the target, None if there is none
+        """
+        self.refresh()
+        walkable, distances = self.walkable.data, self.distances.data
+        width, height = distances.shape
+        best, best_distance = None, distances[tilex, tiley]
+        if best_distance == UNREACHED:
+            return None
+        for dx, dy, _ in DIRECTIONS:
+            nx, ny = tilex + dx, tiley + dy
+            if not (0 <= nx < width and 0 <= ny < height) or not walkable[nx, ny]:
+                continue
+            if dx and dy and not (walkable[nx, tiley] and walkable[tilex, ny]):
+                continue
+            if best_distance < distances[nx, ny] != UNREACHED:
+                best, best_distance = (dx, dy), distances[nx, ny]
+        return best
+
+    def refresh(self):
+        """
+        Recomputes the field if it is out of date
+        :return: nothing
+        """
+        if self.__dirty and self.__target is not None:
+            with stats.scope("flow_field"):
+                self.__compute()
+            self.__dirty = False
+
+    def __compute(self):
+        distances, directions = self.distances.data, self.directions.data
+        if self.__box is not None:
+            left, top, right, bottom = self.__box
+            distances[left:right, top:bottom] = UNREACHED
+            directions[left:right, top:bottom] = NO_DIRECTION
+            self.__box = None
+
+        tilex, tiley = self.__target
+        if not (0 <= tilex < self.walkable.width and 0 <= tiley < self.walkable.height) or \
+                not self.walkable[tilex, tiley]:
+            return
+        self.__walkable[1:-1, 1:-1] = self.walkable.data
+
+        # Dijkstra with a bucket per distance, each bucket is expanded at once.
+        # Tiles are indices into the flattened padded arrays
+        flat_distances, flat_walkable = self.__distances.reshape(-1), self.__walkable.reshape(-1)
+        height = self.__distances.shape[1]
+        # moves of the same cost are expanded together: offsets of the neighbours and of the two tiles
+        # beside the move that must be walkable too, which are the neighbour itself for orthogonal moves
+        groups = []
+        for cost in (ORTHOGONAL_COST, DIAGONAL_COST):
+            offsets, offsetsx, offsetsy = [], [], []
+            for dx, dy, move_cost in DIRECTIONS:
+                if move_cost == cost:
+                    offset = dx * height + dy
+                    offsets.append(offset)
+                    offsetsx.append(dx * height if dx and dy else offset)
+                    offsetsy.append(dy if dx and dy else offset)
+            groups.append((np.array(offsets), np.array(offsetsx), np.array(offsetsy), cost))
+
+        distances[tilex, tiley] = 0
+        buckets = {0: [np.array([(tilex + 1) * height + tiley + 1], dtype=np.intp)]}
+        reached = []
+        while buckets:
+            level = min(buckets)
+            if level > self.max_cost:
+                break
+            cells = buckets.pop(level)
+            cells = cells[0] if len(cells) == 1 else np.concatenate(cells)
+            cells = cells[flat_distances[cells] == level]  # tiles reached by a shorter way meanwhile
+            if len(cells) == 0:
+                continue
+            reached.append(cells)
+
+            cells = cells[:, np.newaxis]
+            for offsets, offsetsx, offsetsy, cost in groups:
+                neighbours = cells + offsets
+                passable = flat_walkable[neighbours] & flat_walkable[cells + offsetsx] & flat_walkable[cells + offsetsy]
+                neighbours = neighbours[passable]
+                neighbours = neighbours[flat_distances[neighbours] > level + cost]
+                if len(neighbours):
+                    flat_distances[neighbours] = level + cost
+                    buckets.setdefault(level + cost, []).append(neighbours)
+
+        # tentative distances past max_cost are dropped
+        for cells in buckets.values():
+            cells = np.concatenate(cells)
+            flat_distances[cells[flat_distances[cells] > self.max_cost]] = UNREACHED
+
+        reached = np.concatenate(reached)
+        xs, ys = reached // height - 1, reached % height - 1
+        self.__box = (int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1)
+        stats.count("flow_field_tiles", len(reached))
+
+        self.__compute_directions()
+
+    def __compute_directions(self):
+        left, top, right, bottom = self.__box
+        # in padded coordinates
+        x0, y0, x1, y1 = left + 1, top + 1, right + 1, bottom + 1
+
+        neighbours = np.empty((len(DIRECTIONS), right - left, bottom - top), dtype=np.int32)
+        for index, (dx, dy, _) in enumerate(DIRECTIONS):
+            shifted = self.__distances[x0 + dx:x1 + dx, y0 + dy:y1 + dy]
+            if dx and dy:
+                corner = self.__walkable[x0 + dx:x1 + dx, y0:y1] & self.__walkable[x0:x1, y0 + dy:y1 + dy]
+                shifted = np.where(corner, shifted, UNREACHED)
+            neighbours[index] = shifted
+
+        best = neighbours.argmin(axis=0)
+        best_distance = np.take_along_axis(neighbours, best[np.newaxis], axis=0)[0]
+        own = self.__distances[x0:x1, y0:y1]
+        self.directions.data[left:right, top:bottom] = np.where(
+            (own != UNREACHED) & (best_distance < own), best, NO_DIRECTION)
@@ -1,23 +1,44 @@
 import math
 import sys
-from os import path, getcwd
 from sprites import sprite_groups
 
+import numpy as np
+
+from game import kinds, save
+from game.assets import AssetLoader, FONT, SPRITESHEET_IMAGE, TEXT_BOX_IMAGE
+from game.factories import FACTORIES, ITEM_KINDS, STATIC_KINDS
+from game.flow_field import FlowField
+from game.grid import TileGrid
 from game.map import *
-from items.pickable import Pickable
+from game.navigation import Navigation
+from game.static_tiles import StaticTileStore
+from game.world import StreamingWorld
+from misc.instrumentation import stats
 from nanogui import Nanogui
-from sprites.door import Door
 from sprites.item import Item
-from sprites.player import Player
-from sprites.wall import Wall
 from triggers import *
 from ui.camera import *
-from ui.fov import calc_fov
+from ui.dirty_rects import DirtyRects
+from ui.fov import Fov
 from ui.spritesheet import Spritesheet
+from ui.text import text_renderer
+from ui.tile_layer import StaticTileLayer
+
+
+TEXT_BOX_RECT = pg.Rect(0, 360, SCREEN_WIDTH, SCREEN_HEIGHT - 360)
+TEXT_POSITION = (150, 390)
+TEXT_WRAP_WIDTH = 400
+TEXT_COLOR = (255, 255, 255)
+STATS_COLOR = (255, 255, 0)
+STATS_POSITION = (8, 8)
 
 
 class Game:
-    def __init__(self, display):
+    def __init__(self, display, assets=None):
+        """
+        :param display: surface of the screen
+        :param assets: AssetLoader with the assets prefetched, a new one is used if None
+        """
 
         # Contains pictures displayed on the player's screen
         self.picture_queue = [] # TODO: finish
@@ -34,6 +55,9 @@ class Game:
         # Contains keyboard keys just pressed
         self.keys_just_pressed = set()
 
+        # Contains the state of all keyboard keys, indexed by key constants
+        self.keys_pressed = pg.key.get_pressed()
+
         # Contains joystick controls just pressed
         self.joystick_just_pressed = set()
 
@@ -43,6 +67,15 @@ class Game:
         # Updates user's FOV
         self.update_fov = True
 
+        # Incremented each time the visibility of a tile changes
+        self.visibility_version = 0
+
+        # Number of simulation steps run so far
+        self.sim_step = 0
+
+        # Progress from the previous simulation step to the current one, used to interpolate rendering
+        self.sim_alpha = 1.0
+
         self.__display__ = display
         self.__clock__ = pg.time.Clock()
         pg.display.set_caption(WINDOW_TITLE)
@@ -54,66 +87,254 @@ class Game:
             self.__joystick__.init()
 
         self.__map__ = None
+        self.__map_name__ = None
+        self.__triggers__ = []  # text triggers in the order of the map triggers, when not streamed
+        self.__autosaver__ = None
+        self.__autosave_timer__ = 0.0
         self.__camera__ = None
         self.__playing__ = False
-        self.__dt__ = 0.0
+        self.__dt__ = 1 / SIM_RATE
+        self.__render_fps__ = FPS
+        self.__waited_events__ = []  # events that ended an idle wait, handled with the next ones
 
-        self.__textBox__ = pg.image.load("assets/textBox.png").convert_alpha()
-        self.__font__ = pg.font.Font("assets/fonts/Arcon.otf", 20)
-        self.__fontSpace__ = pg.font.Font("assets/fonts/Arcon.otf", 14)
+        # Loads images, fonts and maps, possibly prefetched in the background
+        self.assets = assets if assets is not None else AssetLoader()
 
-        self.__gui__ = Nanogui()
-        self.__visibility_data__ = None  # [x][y] -> True, False
-        self.__fov_data__ = None  # [x][y] -> True, False
+        self.__textBox__ = self.assets.image(TEXT_BOX_IMAGE)
+        self.__font__ = self.assets.font(FONT, 20)
+        self.__fontSpace__ = self.assets.font(FONT, 14)
 
-    def load(self, map_name):
+        self.__gui__ = Nanogui()
+        self.__visibility_data__ = None  # TileGrid [x, y] -> True, False
+        self.__fov_data__ = None  # TileGrid [x, y] -> True, False
+        self.__visibility_versions__ = None  # TileGrid [x, y] -> visibility version of the last change
+        self.__fov__ = None
+        self.__static_layer__ = None
+        self.__world__ = None
+
+        # Contains images shared by the entities of the map, by name
+        self.images = {}
+
+        # Contains the tiles that never move, like walls
+        self.static_tiles = None
+
+        # Finds paths between tiles
+        self.navigation = None
+
+        # Directions towards the player from every tile around
+        self.flow_field = None
+
+        self.__dirty_rects__ = DirtyRects(DIRTY_RECT_RENDERING)
+        self.__last_player_draw__ = None  # (image, screen rect) of the player in the last frame
+        self.__last_text__ = None  # text box message shown in the last frame
+
+        self.__stats_lines__ = []  # rendered lines of the instrumentation overlay
+        self.__stats_rect__ = None  # screen region covered by the overlay
+        self.__stats_refresh__ = 0  # ticks when the overlay is refreshed next
+        stats.enabled = DEBUG_STATS or STATS_DUMP_FILE is not None
+        if STATS_DUMP_FILE is not None:
+            stats.start_dump(STATS_DUMP_FILE)
+        if DEBUG_STATS:
+            self.__gui__.draw_elements.append(self.__draw_stats__)
+
+    def load(self, map_name, state=None):
         """
-        Loads new map with the given name
+        Loads new map with the given name, binary maps are preferred over json ones
         :param map_name: map to be loaded
+        :param state: save to be restored on the map, see game.save
         :return: nothing
         """
-        assets_folder = path.join(getcwd(), 'assets')
-        self.__map__ = Map(path.join(assets_folder, 'maps/' + map_name + '.json'))
-
-        self.spritesheet = Spritesheet(path.join(assets_folder, 'spritesheet.png'), 32)
-        wall_img = self.spritesheet.get_image_at_row_col(0, 0)
-        apple_img = self.spritesheet.get_image_alpha_at_row_col(1, 0)
-
-        self.__visibility_data__ = [[True] * self.__map__.height for i in range(self.__map__.width)]
-        self.__fov_data__ = [[True] * self.__map__.height for i in range(self.__map__.width)]
-
-        for node in self.__map__.objects:
-            x, y = node['x'], node['y']
-            if node["name"] == 'WALL':
-                Wall(self, x, y, wall_img)
-                self.__visibility_data__[x][y] = False
-            elif node["name"] == 'PLAYER':
-                self.player = Player(self, x, y)
-            elif node["name"] == 'APPLE':
-                item = Item(self, x, y, apple_img)
-                item.pickable = Pickable(item, 'apple', False, 1, False)
-            elif node["name"] == "DOOR":
-                Door(self, x, y, node["dir"])
-                self.__visibility_data__[x][y] = False  # TODO opened doors visibility
-
-        for trigger in self.__map__.triggers:
-            TextTrigger(self,
-                        pg.Rect(trigger["x"], trigger["y"], trigger["width"], trigger["height"]),
-                        trigger["text"])
+        self.__map_name__ = map_name
+        self.load_map(self.assets.map(map_name), state)
 
+    def load_map(self, game_map, state=None):
+        """
+        Loads the given map
+        :param game_map: Map to be loaded
+        :param state: save to be restored on the map, see game.save
+        :return: nothing
+        """
+        self.__map__ = game_map
+
+        self.spritesheet = Spritesheet(SPRITESHEET_IMAGE, 32, sheet=self.assets.image(SPRITESHEET_IMAGE))
+        self.images = {
+            "wall": self.spritesheet.get_region("wall"),
+            "apple": self.spritesheet.get_region("apple")
+        }
+
+        self.__visibility_data__ = TileGrid(self.__map__.width, self.__map__.height, True)
+        self.__fov_data__ = TileGrid(self.__map__.width, self.__map__.height, True)
+        self.__visibility_versions__ = TileGrid(self.__map__.width, self.__map__.height, 0, np.int64)
+
+        xs, ys, kind_column, dirs = self.__map__.xs, self.__map__.ys, self.__map__.kinds, self.__map__.dirs
+
+        self.static_tiles = StaticTileStore(self.__map__.width, self.__map__.height)
+        self.static_tiles.register_kind(kinds.WALL, self.images["wall"])
+        static = np.isin(kind_column, STATIC_KINDS)
+        for kind in STATIC_KINDS:
+            selected = kind_column == kind
+            self.static_tiles.set_many(xs[selected], ys[selected], kind)
+
+        self.__visibility_data__.data[self.static_tiles.opaque()] = False
+        doors = kind_column == kinds.DOOR  # TODO opened doors visibility
+        self.__visibility_data__.set_many(xs[doors], ys[doors], False)
+
+        walkable = TileGrid(self.__map__.width, self.__map__.height, True)
+        walkable.data[self.static_tiles.solid()] = False
+        walkable.set_many(xs[doors], ys[doors], False)
+        self.navigation = Navigation(walkable)
+        self.flow_field = FlowField(walkable)
+
+        self.__static_layer__ = StaticTileLayer(self.static_tiles) if BAKE_STATIC_TILES else None
+
+        # entities other than the player and the static tiles, spawned now or streamed in by chunks
+        others = (kind_column != kinds.PLAYER) & (kind_column != kinds.NONE) & ~static
+        removed = {}  # (x, y) -> kind of the saved items that are not where the map puts them
+        if state is not None:
+            removed = dict.fromkeys(save.removed_origins(state))
+            for index in np.flatnonzero(others).tolist():
+                if (int(xs[index]), int(ys[index])) in removed:
+                    removed[(int(xs[index]), int(ys[index]))] = int(kind_column[index])
+                    others[index] = False
+
+            # checked before anything is spawned, the save may come from another version of the map
+            if any(kind not in ITEM_KINDS for kind in removed.values()) or \
+                    any(not 0 <= index < len(self.__map__.triggers) for index in state["triggers"]):
+                raise ValueError("The save does not match the map")
+
+        players = np.flatnonzero(kind_column == kinds.PLAYER)
+        if len(players) == 0:
+            raise ValueError("The map has no PLAYER object")
+        self.player = self.spawn(kinds.PLAYER, int(xs[players[-1]]), int(ys[players[-1]]))
+
+        if STREAMING_WORLD:
+            self.__world__ = StreamingWorld(self, xs[others], ys[others], kind_column[others], dirs[others],
+                                            self.__map__.triggers)
+            self.__triggers__ = []
+        else:
+            self.__world__ = None
+            self.spawn_many(xs[others], ys[others], kind_column[others], dirs[others])
+            self.__triggers__ = [self.spawn_trigger(trigger) for trigger in self.__map__.triggers]
+
+        self.__fov__ = Fov(FOV_RADIUS, self.__visibility_data__, self.__fov_data__,
+                           tile_versions=self.__visibility_versions__)
         self.__camera__ = Camera(self.__map__.width_screen, self.__map__.height_screen)
+        if state is not None:
+            self.__restore__(state, removed)
+        self.__dirty_rects__.add_full()
+
+        if self.__world__ is not None:
+            self.__camera__.update(self.player)
+            self.__world__.update(self.player.x, self.player.y, self.__camera__.get_view_rect())
+
+    def snapshot(self):
+        """
+        Produces the save of the current state, see game.save
+        :return: save as a dict of plain values
+        """
+        floor_items = list(sprite_groups.items_on_floor)
+        if self.__world__ is not None:
+            open_doors = self.__world__.open_doors()
+            activated_triggers = self.__world__.activated_triggers()
+            floor_items += self.__world__.stashed_items()
+        else:
+            open_doors = {(door.x, door.y) for door in sprite_groups.doors if door.door_open}
+            activated_triggers = {index for index, trigger in enumerate(self.__triggers__) if trigger.activated}
+        return save.snapshot(self.__map_name__, self.player, open_doors, activated_triggers, floor_items)
+
+    def save(self):
+        """
+        Saves the game into SAVE_FILE, on the autosave thread when the game is running
+        :return: nothing
+        """
+        if self.__autosaver__ is not None:
+            self.__autosaver__.submit(self.snapshot())
+        else:
+            save.write_save(SAVE_FILE, self.snapshot())
+
+    def __autosave_failed__(self, error):
+        # called on the autosave thread, appending to the list is atomic
+        self.text_queue.append("Autosave failed: " + str(error))
+
+    def spawn(self, kind, x, y, dir=kinds.NO_DIRECTION):
+        """
+        Creates the entity of the given kind through its registered factory
+        :param kind: kind of the map object, see game.kinds
+        :param x: x coordinate in tiles
+        :param y: y coordinate in tiles
+        :param dir: index of the direction in kinds.DIRECTIONS, for doors
+        :return: created entity
+        """
+        return FACTORIES[kind](self, x, y, dir)
+
+    def spawn_many(self, xs, ys, kind_column, dirs):
+        """
+        Creates entities in bulk, one kind at a time
+        :param xs: array of x coordinates in tiles
+        :param ys: array of y coordinates in tiles
+        :param kind_column: array of kinds, see game.kinds
+        :param dirs: array of direction indices
+        :return: list of created entities
+        """
+        created = []
+        for kind in np.unique(kind_column).tolist():
+            create = FACTORIES[kind]
+            selected = kind_column == kind
+            for x, y, dir in zip(xs[selected].tolist(), ys[selected].tolist(), dirs[selected].tolist()):
+                created.append(create(self, x, y, dir))
+        return created
+
+    def spawn_trigger(self, trigger):
+        """
+        Creates the text trigger described by the map trigger
+        :param trigger: map trigger, like {"x": 0, "y": 0, "width": 32, "height": 32, "text": ""}
+        :return: created trigger
+        """
+        return TextTrigger(self,
+                           pg.Rect(trigger["x"], trigger["y"], trigger["width"], trigger["height"]),
+                           trigger["text"])
 
     def run(self):
         """
         Run the game
+
+        The simulation advances in fixed steps of 1 / SIM_RATE seconds, as many as the
+        elapsed time requires but at most MAX_SIM_STEPS per frame. Frames are rendered
+        in between, interpolating the positions of the sprites. With ADAPTIVE_PACING the
+        loop blocks waiting for input while the game is idle, see __idle_timeout__
         :return: nothing
         """
         self.__playing__ = True
+        self.__dt__ = 1 / SIM_RATE
+        if AUTOSAVE_INTERVAL and self.__autosaver__ is None:
+            self.__autosaver__ = save.Autosaver(SAVE_FILE, self.__autosave_failed__)
+        accumulator = 0.0
         while self.__playing__:
-            self.__dt__ = self.__clock__.tick(FPS) / 1000
-            self.__events__()
-            self.__update__()
-            self.__draw__()
+            accumulator += self.__clock__.tick(self.__render_fps__) / 1000
+            self.__adapt_render_rate__()
+            idle_timeout = self.__idle_timeout__() if ADAPTIVE_PACING else 0.0
+            if idle_timeout > 0:
+                waited = self.__wait_for_input__(idle_timeout)
+                if waited is not None:
+                    # nothing happened meanwhile, steps would only advance the timers
+                    self.__skip_idle_time__(accumulator + waited)
+                    accumulator = 0.0
+            with stats.scope("events"):
+                self.__events__()
+            with stats.scope("update"):
+                steps = 0
+                while accumulator >= self.__dt__ and steps < MAX_SIM_STEPS:
+                    self.__update__()
+                    accumulator -= self.__dt__
+                    steps += 1
+                if accumulator >= self.__dt__:
+                    # too far behind, slow the game down instead of spiralling
+                    accumulator %= self.__dt__
+                stats.count("sim_steps", steps)
+            self.sim_alpha = accumulator / self.__dt__
+            with stats.scope("draw"):
+                self.__draw__()
+            stats.end_frame()
 
     def get_axis(self, axis_number):
         """
@@ -137,9 +358,33 @@ class Game:
         :param value:
         :return:
         """
-        self.__visibility_data__[tilex][tiley] = value
+        if self.__visibility_data__[tilex, tiley] == value:
+            return
+
+        self.__visibility_data__[tilex, tiley] = value
+        self.visibility_version += 1
+        self.__visibility_versions__[tilex, tiley] = self.visibility_version
         self.update_fov = True
 
+    def set_walkable(self, tilex, tiley, value):
+        """
+        Sets whether the tile can be walked on, for pathfinding
+        :param tilex: x coordinate in tiles
+        :param tiley: y coordinate in tiles
+        :param value: true if the tile can be walked on
+        :return: nothing
+        """
+        self.navigation.set_walkable(tilex, tiley, value)
+        self.flow_field.tile_changed(tilex, tiley)
+
+    def mark_dirty(self, rect):
+        """
+        Marks the region of the world as changed, so that it is redrawn on the screen
+        :param rect: rectangle in the world coordinates
+        :return: nothing
+        """
+        self.__dirty_rects__.add(rect.move(self.__camera__.rect.topleft))
+
     #  ___________________________________________________________________
     # |                        _                   _                      |
     # |         _ __    _ __  (_) __   __   __ _  | |_    ___             |
@@ -150,18 +395,92 @@ class Game:
     # |___________________________________________________________________|
 
     def __put_text_on_screen__(self, text):
-        self.__display__.blit(self.__textBox__, (0, 360))
-        self.__display__.blit(self.__font__.render(text, True, (255, 255, 255)), (150, 390))
-        self.__display__.blit(self.__fontSpace__.render("[SPACE]", True, (255, 255, 255)), (560, 440))
-        pg.display.flip()
+        self.__display__.blit(self.__textBox__, TEXT_BOX_RECT.topleft)
+        lines = text_renderer.layout(self.__font__, text, TEXT_COLOR, TEXT_WRAP_WIDTH)
+        text_renderer.blit_layout(self.__display__, lines, TEXT_POSITION)
+        self.__display__.blit(text_renderer.render(self.__fontSpace__, "[SPACE]", TEXT_COLOR), (560, 440))
 
     def __draw_fov__(self):
-        for x in range(len(self.__fov_data__)):
-            for y in range(len(self.__fov_data__[0])):
-                if self.__fov_data__[x][y]:
-                    newx, newy = self.__camera__.transform_xy(x * TILE_SIZE, y * TILE_SIZE)
-                    pg.draw.rect(self.__display__, (200, 200, 200), pg.Rect(newx, newy,
-                                                                            TILE_SIZE, TILE_SIZE), 1)
+        xs, ys = self.__fov_data__.nonzero()
+        xs, ys = self.__camera__.transform_xy(xs * TILE_SIZE, ys * TILE_SIZE)
+        for newx, newy in zip(xs.tolist(), ys.tolist()):
+            pg.draw.rect(self.__display__, (200, 200, 200), pg.Rect(newx, newy, TILE_SIZE, TILE_SIZE), 1)
+
+    def __adapt_render_rate__(self):
+        """
+        Lowers the rendering rate when the last frame took longer than its budget,
+        raises it back towards FPS when there is time to spare
+        :return: nothing
+        """
+        budget = 1000 / self.__render_fps__
+        work = self.__clock__.get_rawtime()
+        if work > budget:
+            self.__render_fps__ = max(MIN_FPS, self.__render_fps__ - 5)
+        elif work < budget / 2:
+            self.__render_fps__ = min(FPS, self.__render_fps__ + 1)
+
+    def __restore__(self, state, removed):
+        """
+        Applies the save to the freshly spawned map
+        :param state: save, see game.save
+        :param removed: (x, y) -> kind of the map items moved or picked up in the save
+        :return: nothing
+        """
+        self.player.set_position(*state["player"], False)
+
+        for slot, saved in enumerate(state["inventory"]):
+            if saved is not None:
+                ox, oy, amount = saved
+                item = self.spawn(removed[(ox, oy)], ox, oy)
+                item.remove(sprite_groups.all_sprites, sprite_groups.items_on_floor)
+                item.pickable.amount = amount
+                self.player.container.inventory[slot] = item.pickable
+
+        floor_items = []
+        for ox, oy, x, y in state["items"]:
+            item = self.spawn(removed[(ox, oy)], ox, oy)
+            item.set_position(x, y, False)
+            floor_items.append(item)
+
+        open_doors = {(x, y) for x, y in state["doors"]}
+        if self.__world__ is not None:
+            self.__world__.restore(open_doors, state["triggers"], floor_items)
+        else:
+            for door in sprite_groups.doors:
+                if (door.x, door.y) in open_doors:
+                    door.open_door()
+            for index in state["triggers"]:
+                self.__triggers__[index].activated = True
+
+    def __toggle_stats__(self):
+        if self.__draw_stats__ in self.__gui__.draw_elements:
+            self.__gui__.draw_elements.remove(self.__draw_stats__)
+            stats.enabled = STATS_DUMP_FILE is not None
+            self.__dirty_rects__.add_full()
+        else:
+            self.__gui__.draw_elements.append(self.__draw_stats__)
+            stats.enabled = True
+            self.__stats_refresh__ = 0
+
+    def __draw_stats__(self):
+        now = pg.time.get_ticks()
+        if now >= self.__stats_refresh__ and stats.frames:
+            self.__stats_refresh__ = now + STATS_OVERLAY_REFRESH * 1000
+            times, counters = stats.averages()
+            text = "\n".join(["{} {:.2f} ms".format(name, value) for name, value in sorted(times.items())] +
+                             ["{} {:.0f}".format(name, value) for name, value in sorted(counters.items())])
+            self.__stats_lines__ = text_renderer.layout(self.__fontSpace__, text, STATS_COLOR, SCREEN_WIDTH)
+
+        text_renderer.blit_layout(self.__display__, self.__stats_lines__, STATS_POSITION)
+
+        if self.__stats_lines__:
+            rect = pg.Rect(STATS_POSITION, (0, 0)).unionall(
+                [pg.Rect((STATS_POSITION[0] + dx, STATS_POSITION[1] + dy), line.get_size())
+                 for line, (dx, dy) in self.__stats_lines__])
+            self.__dirty_rects__.add(rect)
+            if self.__stats_rect__ is not None:
+                self.__dirty_rects__.add(self.__stats_rect__)
+            self.__stats_rect__ = rect
 
     def __toggle_fullscreen__(self):
         """Taken from http://pygame.org/wiki/__toggle_fullscreen__"""
@@ -186,16 +505,69 @@ class Game:
 
         pg.mouse.set_cursor(*cursor)
 
+        self.__dirty_rects__.add_full()
+
         return screen
 
     def __quit__(self):
+        if self.__autosaver__ is not None:
+            self.__autosaver__.flush()
+        self.assets.shutdown()
         pg.quit()
         sys.exit()
 
+    def __idle_timeout__(self):
+        """
+        Produces how long the loop can block waiting for input without missing a change
+        on the screen: no key or joystick axis is held, no key press waits for a simulation
+        step, the player stands still and its animation keeps its frame. A text box only
+        waits for input, so it does not keep the game busy
+        :return: seconds, 0 if the game must keep running
+        """
+        if stats.enabled or self.keys_just_pressed or self.joystick_just_pressed or any(self.keys_pressed):
+            return 0.0
+        if self.__joystick__ is not None and any(abs(self.__joystick__.get_axis(axis)) >= JOYSTICK_THRESHOLD
+                                                 for axis in range(self.__joystick__.get_numaxes())):
+            return 0.0
+        # the last frame may still be interpolating a move
+        if self.player.is_moving() or self.player.get_draw_rect() != self.player.get_image_rect():
+            return 0.0
+
+        timeout = self.player.animation_timeout()
+        if timeout is None:
+            return IDLE_MAX_WAIT
+        return min(timeout, IDLE_MAX_WAIT) if timeout > self.__dt__ else 0.0
+
+    def __wait_for_input__(self, timeout):
+        """
+        Blocks until an event arrives or the timeout expires
+        :param timeout: seconds
+        :return: seconds waited if the timeout expired, None if an event arrived, the time
+        waited for it is dropped so that the input does not apply to it
+        """
+        event = pg.event.wait(max(1, int(timeout * 1000)))
+        waited = self.__clock__.tick() / 1000
+        if event.type == pg.NOEVENT:
+            return waited
+        self.__waited_events__.append(event)
+        return None
+
+    def __skip_idle_time__(self, seconds):
+        """
+        Advances the timers by the time spent idle, in place of the simulation steps
+        :param seconds: time spent idle
+        :return: nothing
+        """
+        self.player.skip_time(seconds)
+        if self.__autosaver__ is not None:
+            self.__autosave_timer__ += seconds
+
     def __events__(self):
-        self.keys_just_pressed.clear()
-        self.joystick_just_pressed.clear()
-        for event in pg.event.get():
+        # keys just pressed are kept until a simulation step consumes them
+        self.keys_pressed = pg.key.get_pressed()
+        events = self.__waited_events__ + pg.event.get()
+        self.__waited_events__ = []
+        for event in events:
             if event.type == pg.QUIT:
                 self.__quit__()
             if event.type == pg.KEYDOWN:
@@ -204,46 +576,110 @@ class Game:
                     self.__quit__()
                 if event.key == pg.K_F11:
                     self.__toggle_fullscreen__()
+                if event.key == getattr(pg, 'K_' + SAVE_KEY):
+                    self.save()
+                if event.key == getattr(pg, 'K_' + DEBUG_STATS_KEY):
+                    self.__toggle_stats__()
             if event.type == pg.JOYBUTTONDOWN:
                 self.joystick_just_pressed.add(event.button)
 
     def __update__(self):
+        """
+        Runs one simulation step of __dt__ seconds
+        :return: nothing
+        """
+        self.sim_step += 1
         self.__gui__.pre(self.__joystick__)
 
-        for sprite in sprite_groups.all_sprites:
-            sprite.update(self.__dt__)
-
-        if self.__camera__.update(self.player) or self.update_fov:
-            player_hit_rect = self.player.get_hit_rect()
-            player_tilex = math.floor(player_hit_rect.x / TILE_SIZE)
-            player_tiley = math.floor(player_hit_rect.y / TILE_SIZE)
-
-            self.__fov_data__ = calc_fov(player_tilex, player_tiley, FOV_RADIUS,
-                                         self.__visibility_data__, self.__fov_data__)
+        with stats.scope("sprites"):
+            for sprite in sprite_groups.all_sprites:
+                sprite.update(self.__dt__)
+
+        if self.__world__ is not None:
+            # the camera view of the last rendered frame
+            with stats.scope("streaming"):
+                self.__world__.update(self.player.x, self.player.y, self.__camera__.get_view_rect())
+
+        player_hit_rect = self.player.get_hit_rect()
+        player_tilex = math.floor(player_hit_rect.x / TILE_SIZE)
+        player_tiley = math.floor(player_hit_rect.y / TILE_SIZE)
+        # computed on the first read of a direction
+        self.flow_field.set_target(player_tilex, player_tiley)
+
+        if self.update_fov:
+            with stats.scope("fov"):
+                fov_changed = self.__fov__.update(player_tilex, player_tiley, self.visibility_version)
+            if fov_changed:
+                # visible floor items and the FOV overlay may change anywhere on the screen
+                self.__dirty_rects__.add_full()
+                stats.count("fov_tiles_lit", self.__fov__.lit_count())
             self.update_fov = False
 
         self.__gui__.after()
 
+        if self.__autosaver__ is not None:
+            self.__autosave_timer__ += self.__dt__
+            if self.__autosave_timer__ >= AUTOSAVE_INTERVAL:
+                self.__autosave_timer__ = 0.0
+                self.__autosaver__.submit(self.snapshot())
+
+        # keys just pressed are handled by the first step only
+        self.keys_just_pressed.clear()
+        self.joystick_just_pressed.clear()
+
     def __draw__(self):
+        # the camera only follows the rendered position of the player, once per frame
+        if self.__camera__.update(self.player):
+            self.__dirty_rects__.add_full()
+
         self.__display__.fill(BG_COLOR)
 
-        # TODO layering
-        for sprite in sprite_groups.all_sprites:
-            if sprite != self.player and not isinstance(sprite, Item):
-                self.__display__.blit(sprite.image, self.__camera__.transform(sprite))
+        with stats.scope("blit_static"):
+            if self.__static_layer__ is not None:
+                self.__static_layer__.draw(self.__display__, self.__camera__)
+            else:
+                self.static_tiles.draw(self.__display__, self.__camera__)
+
+        view = self.__camera__.get_view_rect()
 
-        for sprite in sprite_groups.items_on_floor:
-            tilex = math.floor(sprite.x)
-            tiley = math.floor(sprite.y)
-            if self.__fov_data__[tilex][tiley]:
-                self.__display__.blit(sprite.image, self.__camera__.transform(sprite))
+        # TODO layering
+        with stats.scope("blit_sprites"):
+            for sprite in sprite_groups.all_sprites.query(view):
+                if sprite != self.player and not isinstance(sprite, Item):
+                    self.__display__.blit(sprite.image, self.__camera__.transform(sprite))
+                    stats.count("sprites_drawn")
+
+        with stats.scope("blit_items"):
+            # tiles both on the screen and in the FOV, an item on the tile left or above
+            # the screen may still reach into it
+            left = max(0, math.floor(view.left / TILE_SIZE) - 1)
+            top = max(0, math.floor(view.top / TILE_SIZE) - 1)
+            right = math.floor((view.right - 1) / TILE_SIZE) + 1
+            bottom = math.floor((view.bottom - 1) / TILE_SIZE) + 1
+            if sprite_groups.items_on_floor.tiles:
+                xs, ys = np.nonzero(self.__fov_data__.data[left:right, top:bottom])
+                for sprite in sprite_groups.items_on_floor.on_tiles((xs + left).tolist(), (ys + top).tolist()):
+                    self.__display__.blit(sprite.image, self.__camera__.transform(sprite))
+                    stats.count("sprites_drawn")
 
         if DEBUG_FOV:
             self.__draw_fov__()
 
+        player_draw = (self.player.image, self.player.get_draw_rect())
+        if player_draw != self.__last_player_draw__:
+            self.mark_dirty(player_draw[1])
+            if self.__last_player_draw__ is not None:
+                self.mark_dirty(self.__last_player_draw__[1])
+            self.__last_player_draw__ = player_draw
         self.__display__.blit(self.player.image, self.__camera__.transform(self.player))
-        if self.text_queue:
-            self.__put_text_on_screen__(self.text_queue[-1])
+
+        text = self.text_queue[-1] if self.text_queue else None
+        if text != self.__last_text__:
+            self.__dirty_rects__.add(TEXT_BOX_RECT)
+            self.__last_text__ = text
+        if text is not None:
+            self.__put_text_on_screen__(text)
 
         self.__gui__.draw()
-        pg.display.flip()
\ No newline at end of file
+        with stats.scope("present"):
+            self.__dirty_rects__.present()
\ No newline at end of file
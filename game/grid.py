@@ -0,0 +1,64 @@
+import numpy as np
+
+
+class TileGrid:
+    """
+    A value per map tile, stored in a contiguous NumPy array indexed [x, y]
+    """
+
+    def __init__(self, width, height, fill=False, dtype=np.bool_):
+        """
+        :param width: width of the grid in tiles
+        :param height: height of the grid in tiles
+        :param fill: initial value of every tile
+        :param dtype: NumPy type of a tile value
+        """
+        self.data = np.full((width, height), fill, dtype=dtype)
+
+    @property
+    def width(self):
+        return self.data.shape[0]
+
+    @property
+    def height(self):
+        return self.data.shape[1]
+
+    def __getitem__(self, xy):
+        return self.data[xy]
+
+    def __setitem__(self, xy, value):
+        self.data[xy] = value
+
+    def fill(self, value):
+        """
+        Sets every tile to the value
+        :param value: new value of the tiles
+        :return: nothing
+        """
+        self.data.fill(value)
+
+    def get_many(self, xs, ys):
+        """
+        Produces the values of the tiles at the given coordinates
+        :param xs: sequence of x coordinates
+        :param ys: sequence of y coordinates
+        :return: array of values, one per (x, y) pair
+        """
+        return self.data[xs, ys]
+
+    def set_many(self, xs, ys, value):
+        """
+        Sets the tiles at the given coordinates to the value
+        :param xs: sequence of x coordinates
+        :param ys: sequence of y coordinates
+        :param value: new value of the tiles
+        :return: nothing
+        """
+        self.data[xs, ys] = value
+
+    def nonzero(self):
+        """
+        Produces the coordinates of the tiles with a truthy value
+        :return: (xs, ys) arrays
+        """
+        return np.nonzero(self.data)
@@ -0,0 +1,13 @@
+# Kinds of the map objects, as stored in the kinds column of Map
+NONE = 0
+WALL = 1
+APPLE = 2
+DOOR = 3
+PLAYER = 4
+
+NAMES = {WALL: "WALL", APPLE: "APPLE", DOOR: "DOOR", PLAYER: "PLAYER"}
+IDS = {name: kind for kind, name in NAMES.items()}
+
+# Directions, as stored in the dirs column of Map
+DIRECTIONS = ("up", "right", "down", "left")
+NO_DIRECTION = -1
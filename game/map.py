@@ -1,21 +1,55 @@
 import json
 
+import numpy as np
+
+from game import kinds
+from game.binmap import BinaryMapData, is_binary_map
 from game.settings import *
 
 
 class Map:
     def __init__(self, filename):
-        with open(filename, 'rt') as f:
-            self.data = json.loads(f.read())
-            self.objects = self.data["objects"]
-            self.triggers = self.data["triggers"]
-
-        self.width = max(map(lambda node: node["x"], self.objects)) + 1 \
-                     - min(map(lambda node: node["x"], self.objects))
-        self.height = max(map(lambda node: node["y"], self.objects)) + 1 \
-                      - min(map(lambda node: node["y"], self.objects))
+        self.binary = None
+
+        if is_binary_map(filename):
+            self.binary = BinaryMapData(filename)
+            self.data = None
+            self.triggers = self.binary.triggers
+
+            # parallel arrays, one entry per map object
+            self.xs, self.ys, self.kinds, self.dirs = self.binary.columns()
+        else:
+            with open(filename, 'rt') as f:
+                self.data = json.loads(f.read())
+                self.triggers = self.data["triggers"]
+
+            self.xs, self.ys, self.kinds, self.dirs = columns_of(self.data["objects"])
+
+        self.width = int(self.xs.max()) + 1 - int(self.xs.min())
+        self.height = int(self.ys.max()) + 1 - int(self.ys.min())
         self.on_update_screen()
 
     def on_update_screen(self):
         self.width_screen = self.width * TILE_SIZE
         self.height_screen = self.height * TILE_SIZE
+
+
+def columns_of(objects):
+    """
+    Converts map objects in the json format into parallel arrays in a single pass.
+    Objects with an unknown name get kinds.NONE, they count for the map bounds only
+    :param objects: list of map objects
+    :return: (xs, ys, kinds, dirs) arrays
+    """
+    xs, ys, kind_column, dirs = [], [], [], []
+
+    kind_ids = kinds.IDS
+    directions = kinds.DIRECTIONS
+    for node in objects:
+        xs.append(node["x"])
+        ys.append(node["y"])
+        kind_column.append(kind_ids.get(node["name"], kinds.NONE))
+        dirs.append(directions.index(node["dir"]) if "dir" in node else kinds.NO_DIRECTION)
+
+    return (np.array(xs, dtype=np.int32), np.array(ys, dtype=np.int32),
+            np.array(kind_column, dtype=np.uint8), np.array(dirs, dtype=np.int8))
@@ -0,0 +1,365 @@
+"""
+Pathfinding over the walkability grid of the map
+
+Paths are lists of tiles. Agents move in 8 directions but never cut the corner
+of a blocked tile. Short paths are found by A* on the tiles, long ones on a graph
+of clusters first (hierarchical A*): the map is split into square clusters, every
+run of open tiles along a cluster border is an entrance, and the entrances of a
+cluster are linked by the paths between them inside the cluster. The resulting
+paths are close to, but not always, the shortest ones. Borders and links of a
+cluster are found the first time a search reaches it, so only the clusters the
+agents walk through are ever built.
+"""
+import heapq
+import math
+from collections import OrderedDict
+
+from game.settings import NAV_CLUSTER_TILES, PATH_CACHE_SIZE
+from misc.instrumentation import stats
+
+SQRT2 = math.sqrt(2)
+
+# (dx, dy, cost) of the moves from a tile
+STEPS = [(1, 0, 1.0), (-1, 0, 1.0), (0, 1, 1.0), (0, -1, 1.0),
+         (1, 1, SQRT2), (1, -1, SQRT2), (-1, 1, SQRT2), (-1, -1, SQRT2)]
+
+
+def octile(a, b):
+    dx, dy = abs(a[0] - b[0]), abs(a[1] - b[1])
+    return dx + dy + (SQRT2 - 2) * min(dx, dy)
+
+
+def find_path(walkable, start, goal, bounds):
+    """
+    A* search between two tiles
+    :param walkable: nested lists, walkable[x][y] is true if the tile can be walked on
+    :param start: (x, y) of the first tile
+    :param goal: (x, y) of the last tile
+    :param bounds: (left, top, right, bottom) of the tiles searched, right and bottom excluded
+    :return: (path, cost) with the path as a list of tiles from start to goal, or (None, inf)
+    """
+    left, top, right, bottom = bounds
+    came_from = {start: None}
+    costs = {start: 0.0}
+    frontier = [(octile(start, goal), 0.0, start)]
+    while frontier:
+        _, cost, tile = heapq.heappop(frontier)
+        if tile == goal:
+            path = []
+            while tile is not None:
+                path.append(tile)
+                tile = came_from[tile]
+            path.reverse()
+            return path, cost
+        if cost > costs[tile]:
+            continue
+
+        x, y = tile
+        for dx, dy, step in STEPS:
+            nx, ny = x + dx, y + dy
+            if not (left <= nx < right and top <= ny < bottom) or not walkable[nx][ny]:
+                continue
+            if dx and dy and not (walkable[nx][y] and walkable[x][ny]):
+                continue
+            new_cost = cost + step
+            neighbour = (nx, ny)
+            if new_cost < costs.get(neighbour, math.inf):
+                costs[neighbour] = new_cost
+                came_from[neighbour] = tile
+                heapq.heappush(frontier, (new_cost + octile(neighbour, goal), new_cost, neighbour))
+
+    return None, math.inf
+
+
+def find_paths(walkable, start, goals, bounds):
+    """
+    Dijkstra search from a tile to many tiles, stops once they are all reached
+    :param walkable: nested lists, walkable[x][y] is true if the tile can be walked on
+    :param start: (x, y) of the first tile
+    :param goals: tiles to be reached
+    :param bounds: (left, top, right, bottom) of the tiles searched, right and bottom excluded
+    :return: goal -> (path, cost) for the goals that can be reached
+    """
+    left, top, right, bottom = bounds
+    remaining = set(goals)
+    came_from = {start: None}
+    costs = {start: 0.0}
+    frontier = [(0.0, start)]
+    found = {}
+    while frontier and remaining:
+        cost, tile = heapq.heappop(frontier)
+        if cost > costs[tile]:
+            continue
+        if tile in remaining:
+            remaining.discard(tile)
+            path = []
+            node = tile
+            while node is not None:
+                path.append(node)
+                node = came_from[node]
+            path.reverse()
+            found[tile] = (path, cost)
+
+        x, y = tile
+        for dx, dy, step in STEPS:
+            nx, ny = x + dx, y + dy
+            if not (left <= nx < right and top <= ny < bottom) or not walkable[nx][ny]:
+                continue
+            if dx and dy and not (walkable[nx][y] and walkable[x][ny]):
+                continue
+            new_cost = cost + step
+            neighbour = (nx, ny)
+            if new_cost < costs.get(neighbour, math.inf):
+                costs[neighbour] = new_cost
+                came_from[neighbour] = tile
+                heapq.heappush(frontier, (new_cost, neighbour))
+
+    return found
+
+
+class Navigation:
+    """
+    Answers path queries on the map, keeping the found paths until a tile on or
+    next to them is blocked
+    """
+
+    def __init__(self, walkable, cluster_tiles=NAV_CLUSTER_TILES, cache_size=PATH_CACHE_SIZE):
+        """
+        :param walkable: TileGrid, True if the tile can be walked on
+        :param cluster_tiles: width and height of a cluster in tiles
+        :param cache_size: maximum number of cached paths
+        """
+        self.walkable = walkable
+        self.cluster_tiles = cluster_tiles
+        self.cache_size = cache_size
+
+        self.__tiles = walkable.data.tolist()  # walkable[x][y] as nested lists, faster to read per tile
+        self.__width, self.__height = walkable.width, walkable.height
+
+        # (cluster, right or bottom neighbour cluster) -> [(tile, neighbour tile)] entrances, built on first use
+        self.__borders = {}
+        self.__links = {}  # entrance -> entrances across the built borders
+        self.__edges = {}  # cluster -> entrance -> [(other entrance, cost, path)], built on first use
+        self.__cache = OrderedDict()  # (start, goal) -> path or None
+        self.__paths_on = {}  # tile -> keys of the cached paths through the tile
+
+    def cluster_of(self, tilex, tiley):
+        return tilex // self.cluster_tiles, tiley // self.cluster_tiles
+
+    def set_walkable(self, tilex, tiley, value):
+        """
+        Updates the tile, the paths on or next to a blocked tile are forgotten
+        :param tilex: x coordinate in tiles
+        :param tiley: y coordinate in tiles
+        :param value: true if the tile can be walked on
+        :return: nothing
+        """
+        if self.__tiles[tilex][tiley] == value:
+            return
+        self.walkable[tilex, tiley] = value
+        self.__tiles[tilex][tiley] = value
+
+        if value:
+            # a new way may exist where there was none
+            for key in [key for key, path in self.__cache.items() if path is None]:
+                del self.__cache[key]
+        else:
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for key in list(self.__paths_on.get((tilex + dx, tiley + dy), ())):
+                        self.__forget(key)
+
+        # the borders are found again when a search reaches them
+        cx, cy = self.cluster_of(tilex, tiley)
+        for neighbour in ((cx - 1, cy), (cx, cy - 1)):
+            self.__drop_border(neighbour, (cx, cy))
+        for neighbour in ((cx + 1, cy), (cx, cy + 1)):
+            self.__drop_border((cx, cy), neighbour)
+        for cluster in ((cx, cy), (cx - 1, cy), (cx + 1, cy), (cx, cy - 1), (cx, cy + 1)):
+            self.__edges.pop(cluster, None)
+
+    def path(self, start, goal):
+        """
+        Produces a path between the tiles
+        :param start: (x, y) of the first tile
+        :param goal: (x, y) of the last tile
+        :return: tuple of tiles from start to goal, None if there is no way
+        """
+        key = (start, goal)
+        if key in self.__cache:
+            self.__cache.move_to_end(key)
+            stats.count("path_cache_hits")
+            return self.__cache[key]
+
+        with stats.scope("pathfinding"):
+            path = self.__find(start, goal)
+        if path is not None:
+            path = tuple(path)
+
+        self.__cache[key] = path
+        if path is not None:
+            for tile in path:
+                self.__paths_on.setdefault(tile, set()).add(key)
+        if len(self.__cache) > self.cache_size:
+            self.__forget(next(iter(self.__cache)))
+        return path
+
+    def __find(self, start, goal):
+        tiles = self.__tiles
+        if not (self.__inside(start) and self.__inside(goal)):
+            return None
+        if not tiles[start[0]][start[1]] or not tiles[goal[0]][goal[1]]:
+            return None
+
+        start_cluster, goal_cluster = self.cluster_of(*start), self.cluster_of(*goal)
+        if start_cluster == goal_cluster:
+            path, _ = find_path(tiles, start, goal, self.__bounds(start_cluster))
+            if path is not None:
+                return path
+
+        # ways out of the start cluster and into the goal cluster
+        starts = self.__connect(start, start_cluster)
+        goals = self.__connect(goal, goal_cluster)
+        if not starts or not goals:
+            return None
+
+        # A* over the entrances, the paths found are the edges
+        came_from = {}
+        costs = {}
+        frontier = []
+        for entrance, (cost, way) in starts.items():
+            costs[entrance] = cost
+            came_from[entrance] = (None, way)
+            heapq.heappush(frontier, (cost + octile(entrance, goal), cost, entrance))
+
+        while frontier:
+            _, cost, entrance = heapq.heappop(frontier)
+            if cost > costs[entrance]:
+                continue
+            if entrance == goal:
+                break
+
+            # the edges first, they build the borders of the cluster and so the links of the entrance
+            edges = self.__cluster_edges(self.cluster_of(*entrance)).get(entrance, [])
+            moves = [(other, 1.0, [entrance, other]) for other in self.__links.get(entrance, ())] + edges
+            if entrance in goals:
+                goal_cost, way = goals[entrance]
+                moves.append((goal, goal_cost, list(reversed(way))))
+
+            for other, step, way in moves:
+                new_cost = cost + step
+                if new_cost < costs.get(other, math.inf):
+                    costs[other] = new_cost
+                    came_from[other] = (entrance, way)
+                    heapq.heappush(frontier, (new_cost + octile(other, goal), new_cost, other))
+        else:
+            return None
+
+        # join the ways of the edges, each way starts where the previous one ends
+        ways = []
+        node = goal
+        while node is not None:
+            node, way = came_from[node]
+            ways.append(way)
+        path = [start]
+        for way in reversed(ways):
+            path.extend(way[1:])
+        return path
+
+    def __connect(self, tile, cluster):
+        """
+        Produces the ways between the tile and the entrances of its cluster
+        :return: entrance -> (cost, path from the tile to the entrance)
+        """
+        found = find_paths(self.__tiles, tile, self.__entrances(cluster), self.__bounds(cluster))
+        return {entrance: (cost, path) for entrance, (path, cost) in found.items()}
+
+    def __cluster_edges(self, cluster):
+        edges = self.__edges.get(cluster)
+        if edges is None:
+            edges = {}
+            bounds = self.__bounds(cluster)
+            entrances = self.__entrances(cluster)
+            for i, a in enumerate(entrances):
+                for b, (path, cost) in find_paths(self.__tiles, a, entrances[i + 1:], bounds).items():
+                    edges.setdefault(a, []).append((b, cost, path))
+                    edges.setdefault(b, []).append((a, cost, list(reversed(path))))
+            self.__edges[cluster] = edges
+        return edges
+
+    def __entrances(self, cluster):
+        cx, cy = cluster
+        entrances = []
+        for key, side in (((cluster, (cx + 1, cy)), 0), ((cluster, (cx, cy + 1)), 0),
+                          (((cx - 1, cy), cluster), 1), (((cx, cy - 1), cluster), 1)):
+            entrances.extend(pair[side] for pair in self.__border(*key))
+        return entrances
+
+    def __border(self, cluster, neighbour):
+        """
+        Produces the entrances between a cluster and its right or bottom neighbour, building them on first use
+        """
+        key = (cluster, neighbour)
+        entrances = self.__borders.get(key)
+        if entrances is None:
+            entrances = self.__borders[key] = self.__build_border(cluster, neighbour)
+            for tile, other in entrances:
+                self.__links.setdefault(tile, []).append(other)
+                self.__links.setdefault(other, []).append(tile)
+        return entrances
+
+    def __drop_border(self, cluster, neighbour):
+        for tile, other in self.__borders.pop((cluster, neighbour), ()):
+            self.__links[tile].remove(other)
+            self.__links[other].remove(tile)
+
+    def __build_border(self, cluster, neighbour):
+        """
+        Finds the entrances between a cluster and its right or bottom neighbour,
+        one in the middle of every run of open tile pairs across the border
+        """
+        if min(cluster) < 0:
+            # the neighbour of a cluster in the first row or column, outside the map
+            return []
+
+        size = self.cluster_tiles
+        horizontal = neighbour[0] != cluster[0]
+        if horizontal:
+            x = neighbour[0] * size
+            if x >= self.__width:
+                return []
+            cells = [((x - 1, y), (x, y)) for y in range(cluster[1] * size, min(self.__height, (cluster[1] + 1) * size))]
+        else:
+            y = neighbour[1] * size
+            if y >= self.__height:
+                return []
+            cells = [((x, y - 1), (x, y)) for x in range(cluster[0] * size, min(self.__width, (cluster[0] + 1) * size))]
+
+        tiles = self.__tiles
+        entrances = []
+        run = []
+        for pair in cells + [None]:
+            if pair is not None and tiles[pair[0][0]][pair[0][1]] and tiles[pair[1][0]][pair[1][1]]:
+                run.append(pair)
+            elif run:
+                entrances.append(run[len(run) // 2])
+                run = []
+        return entrances
+
+    def __bounds(self, cluster):
+        size = self.cluster_tiles
+        return (cluster[0] * size, cluster[1] * size,
+                min(self.__width, (cluster[0] + 1) * size), min(self.__height, (cluster[1] + 1) * size))
+
+    def __inside(self, tile):
+        return 0 <= tile[0] < self.__width and 0 <= tile[1] < self.__height
+
+    def __forget(self, key):
+        path = self.__cache.pop(key)
+        if path is not None:
+            for tile in path:
+                keys = self.__paths_on.get(tile)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self.__paths_on[tile]
@@ -0,0 +1,165 @@
+"""
+Saved games
+
+A save holds only what changed since the map was loaded, as gzipped json:
+
+    {"version": 1, "map": "map1", "player": [x, y],
+     "inventory": [[origin x, origin y, amount] or null, ...],
+     "items": [[origin x, origin y, x, y], ...],
+     "doors": [[x, y], ...],
+     "triggers": [index, ...]}
+
+Items are identified by the tile of the map they were spawned on. "items" lists the
+items lying on the floor away from their tile, the items of the map missing from
+both "inventory" and "items" are where the map puts them. "doors" are the open
+doors and "triggers" the indices of the activated map triggers.
+"""
+import gzip
+import json
+import os
+import threading
+
+VERSION = 1
+
+
+def snapshot(map_name, player, open_doors, activated_triggers, floor_items):
+    """
+    Produces the save of the game state
+    :param map_name: name of the loaded map
+    :param player: the player
+    :param open_doors: (x, y) of the open doors
+    :param activated_triggers: indices of the activated map triggers
+    :param floor_items: items lying on the floor
+    :return: save as a dict of plain values
+    """
+    inventory = [None if pickable is None else [*pickable.owner.origin, pickable.amount]
+                 for pickable in player.container.inventory]
+    items = [[*item.origin, item.x, item.y] for item in floor_items
+             if (item.x, item.y) != item.origin]
+
+    return {
+        "version": VERSION,
+        "map": map_name,
+        "player": [player.x, player.y],
+        "inventory": inventory,
+        "items": sorted(items),
+        "doors": sorted([x, y] for x, y in open_doors),
+        "triggers": sorted(activated_triggers)
+    }
+
+
+def removed_origins(state):
+    """
+    Produces the tiles of the map items that are not where the map puts them
+    :param state: save
+    :return: set of (x, y)
+    """
+    origins = {(item[0], item[1]) for item in state["items"]}
+    origins.update((slot[0], slot[1]) for slot in state["inventory"] if slot is not None)
+    return origins
+
+
+def write_save(filename, state):
+    """
+    Writes the save, replacing the previous one only once the new one is complete
+    :param filename: save file
+    :param state: save
+    :return: nothing
+    """
+    tmp_filename = filename + '.tmp'
+    with gzip.open(tmp_filename, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps(state, separators=(',', ':')))
+    os.replace(tmp_filename, filename)
+
+
+def read_save(filename):
+    """
+    Reads the save, raises ValueError if the file does not hold a valid save
+    :param filename: save file
+    :return: save
+    """
+    try:
+        with gzip.open(filename, 'rt', encoding='utf-8') as f:
+            state = json.loads(f.read())
+    except (EOFError, gzip.BadGzipFile, UnicodeDecodeError) as e:
+        raise ValueError("Corrupted save in " + filename) from e
+    if not isinstance(state, dict) or state.get("version") != VERSION:
+        raise ValueError("Unsupported save version in " + filename)
+    if not is_valid(state):
+        raise ValueError("Corrupted save in " + filename)
+    return state
+
+
+def is_valid(state):
+    """
+    Checks that the save holds values of the expected types, see the format above
+    :param state: save
+    :return: true if the save is well formed
+    """
+    try:
+        return (isinstance(state["map"], str) and
+                _is_numbers(state["player"], 2, (int, float)) and
+                all(slot is None or _is_numbers(slot, 3, int) for slot in state["inventory"]) and
+                all(_is_numbers(item, 4, (int, float)) and _is_numbers(item[:2], 2, int) for item in state["items"]) and
+                all(_is_numbers(door, 2, int) for door in state["doors"]) and
+                all(_is_numbers([index], 1, int) for index in state["triggers"]))
+    except (KeyError, TypeError):
+        return False
+
+
+def _is_numbers(value, count, types):
+    return (isinstance(value, list) and len(value) == count and
+            all(isinstance(v, types) and not isinstance(v, bool) for v in value))
+
+
+class Autosaver:
+    """
+    Writes saves on a background thread, only the latest submitted save is written
+    """
+
+    def __init__(self, filename, on_error=None):
+        """
+        :param filename: save file
+        :param on_error: function(error) called on the autosave thread when a save cannot be written
+        """
+        self.filename = filename
+        self.on_error = on_error
+        self.__pending = None  # save waiting to be written
+        self.__writing = False
+        self.__condition = threading.Condition()
+        self.__thread = threading.Thread(target=self.__run, name="autosave", daemon=True)
+        self.__thread.start()
+
+    def submit(self, state):
+        """
+        Queues the save to be written, replacing the one still waiting
+        :param state: save made of plain values not shared with the game
+        :return: nothing
+        """
+        with self.__condition:
+            self.__pending = state
+            self.__condition.notify_all()
+
+    def flush(self):
+        """
+        Waits until the queued save is written
+        :return: nothing
+        """
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.__pending is None and not self.__writing)
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                self.__condition.wait_for(lambda: self.__pending is not None)
+                state, self.__pending = self.__pending, None
+                self.__writing = True
+            try:
+                write_save(self.filename, state)
+            except OSError as e:
+                if self.on_error is not None:
+                    self.on_error(e)
+            finally:
+                with self.__condition:
+                    self.__writing = False
+                    self.__condition.notify_all()
@@ -4,14 +4,68 @@ WINDOW_TITLE = "Cyberpunk Laboratory"
 
 FPS = 60
 
+# The simulation advances in fixed steps, rendering interpolates between the last two of them
+SIM_RATE = 60
+# Steps run at most per rendered frame, the rest of the backlog is dropped
+MAX_SIM_STEPS = 5
+# Rendering slows down to this rate when frames take longer than their budget
+MIN_FPS = 20
+# When nothing moves or animates the loops block waiting for input, waking up at least every IDLE_MAX_WAIT seconds
+ADAPTIVE_PACING = True
+IDLE_MAX_WAIT = 1.0
+
 BG_COLOR = (0, 0, 0)
 
 TILE_SIZE = 32
 
+# Render walls from cached chunk surfaces instead of one blit per wall
+BAKE_STATIC_TILES = True
+STATIC_CHUNK_TILES = 16
+# Number of baked chunks kept in memory, about 1 MB each
+STATIC_CHUNK_CACHE_SIZE = 48
+
+# Push only the changed screen regions while the camera stands still
+DIRTY_RECT_RENDERING = False
+
+# Spawn sprites and triggers only in the chunks around the player
+STREAMING_WORLD = False
+STREAM_CHUNK_TILES = 16
+STREAM_DISTANCE = 1
+
+# Saved game, written on SAVE_KEY and every AUTOSAVE_INTERVAL seconds of play (0 disables autosaves)
+SAVE_FILE = 'savegame.sav'
+SAVE_KEY = 'F5'
+AUTOSAVE_INTERVAL = 30
+
+# Threads loading the assets in the background while the menu is shown
+ASSET_LOADER_WORKERS = 4
+
+# Number of rendered text surfaces kept in memory
+TEXT_CACHE_SIZE = 128
+
 SLITHER_SPEED = 0.05
 FOV_RADIUS = 10
 DEBUG_FOV = False
 
+# Pathfinding clusters are NAV_CLUSTER_TILES x NAV_CLUSTER_TILES tiles
+NAV_CLUSTER_TILES = 10
+PATH_CACHE_SIZE = 1024
+# The flow field towards the player reaches FLOW_FIELD_RANGE orthogonal steps
+FLOW_FIELD_RANGE = 32
+
+# Batches of at least FOV_POOL_THRESHOLD observers are split over FOV_POOL_WORKERS processes, one per CPU if None
+FOV_POOL_THRESHOLD = 64
+FOV_POOL_WORKERS = None
+
+# Main loop instrumentation, the overlay is also toggled in game with F3
+DEBUG_STATS = False
+DEBUG_STATS_KEY = 'F3'
+STATS_HISTORY = 60
+STATS_OVERLAY_REFRESH = 0.5
+# Every frame is written here when set, as CSV or as JSON lines for a .jsonl name
+STATS_DUMP_FILE = None
+STATS_DUMP_ROTATE_FRAMES = 10000
+
 JOYSTICK_THRESHOLD = 0.1
 J_BUTTONS = {
     'A': 0,
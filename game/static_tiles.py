@@ -0,0 +1,142 @@
+import math
+
+import numpy as np
+import pygame as pg
+
+from game import kinds
+from game.grid import TileGrid
+from game.settings import TILE_SIZE
+from misc.instrumentation import stats
+
+
+class StaticTile:
+    """
+    A tile of the store returned by the queries, behaves like a sprite for collision checks
+    """
+    __slots__ = ("store", "x", "y", "kind")
+
+    def __init__(self, store, x, y, kind):
+        self.store = store
+        self.x = x
+        self.y = y
+        self.kind = kind
+
+    def get_hit_rect(self):
+        """
+        Produce the hit rectangle in the world coordinates
+        :return: hit rectangle positioned in the world coordinates
+        """
+        return self.store.hit_boxes[self.kind].move(self.x * TILE_SIZE, self.y * TILE_SIZE)
+
+
+class StaticTileStore:
+    """
+    Tiles that never move, kept as a grid of kinds instead of one sprite per tile.
+    Image and hit box are shared by all the tiles of a kind
+    """
+
+    def __init__(self, width, height):
+        """
+        :param width: width of the map in tiles
+        :param height: height of the map in tiles
+        """
+        self.kinds = TileGrid(width, height, kinds.NONE, np.uint8)
+        self.images = {}  # kind -> image
+        self.hit_boxes = {}  # kind -> hit rectangle in the tile's local coordinates
+        self.__solid = np.zeros(256, dtype=np.bool_)  # kind -> True if the kind blocks movement
+        self.__opaque = np.zeros(256, dtype=np.bool_)  # kind -> True if the kind blocks the view
+
+    def register_kind(self, kind, image, hit_box=(0, 0, TILE_SIZE, TILE_SIZE), solid=True, opaque=True):
+        """
+        Describes the tiles of the kind
+        :param kind: kind of the map object, see game.kinds
+        :param image: image shared by the tiles of the kind
+        :param hit_box: hit rectangle in the tile's local coordinates
+        :param solid: true if the tiles of the kind block movement
+        :param opaque: true if the tiles of the kind block the view
+        :return: nothing
+        """
+        self.images[kind] = image
+        self.hit_boxes[kind] = pg.Rect(hit_box)
+        self.__solid[kind] = solid
+        self.__opaque[kind] = opaque
+
+    def set_many(self, xs, ys, kind):
+        """
+        Puts the tiles of the kind on the given coordinates
+        :param xs: array of x coordinates in tiles
+        :param ys: array of y coordinates in tiles
+        :param kind: kind of the tiles, kinds.NONE to remove them
+        :return: nothing
+        """
+        self.kinds.set_many(xs, ys, kind)
+
+    def solid(self):
+        """
+        Produces the tiles blocking movement
+        :return: boolean array indexed by [x, y]
+        """
+        return self.__solid[self.kinds.data]
+
+    def opaque(self):
+        """
+        Produces the tiles blocking the view
+        :return: boolean array indexed by [x, y]
+        """
+        return self.__opaque[self.kinds.data]
+
+    def query(self, rect):
+        """
+        Produces the solid tiles whose hit boxes collide with the rectangle
+        :param rect: rectangle in world coordinates
+        :return: list of StaticTile
+        """
+        grid = self.kinds.data
+        # hit boxes never leave their tile, so only the tiles under the rectangle are tested
+        left = max(0, math.floor(rect[0] / TILE_SIZE))
+        top = max(0, math.floor(rect[1] / TILE_SIZE))
+        right = min(grid.shape[0], math.floor((rect[0] + max(rect[2], 1) - 1) / TILE_SIZE) + 1)
+        bottom = min(grid.shape[1], math.floor((rect[1] + max(rect[3], 1) - 1) / TILE_SIZE) + 1)
+        if left >= right or top >= bottom:
+            return []
+
+        window = grid[left:right, top:bottom]
+        xs, ys = np.nonzero(self.__solid[window])
+        stats.count("candidates.static_tiles", len(xs))
+
+        hits = []
+        for x, y in zip((xs + left).tolist(), (ys + top).tolist()):
+            tile = StaticTile(self, x, y, int(grid[x, y]))
+            if pg.Rect(rect).colliderect(tile.get_hit_rect()):
+                hits.append(tile)
+        return hits
+
+    def query_point(self, point):
+        """
+        Produces the solid tiles whose hit boxes contain the point
+        :param point: (x, y) in world coordinates
+        :return: list of StaticTile
+        """
+        return [tile for tile in self.query((point[0], point[1], 1, 1))
+                if tile.get_hit_rect().collidepoint(point)]
+
+    def draw(self, surface, camera):
+        """
+        Draws the tiles visible by the camera, one blit per tile
+        :param surface: surface to draw on
+        :param camera: camera used to transform world coordinates
+        :return: nothing
+        """
+        grid = self.kinds.data
+        view = camera.get_view_rect()
+        left, top = max(0, view.left // TILE_SIZE), max(0, view.top // TILE_SIZE)
+        right = min(grid.shape[0], (view.right - 1) // TILE_SIZE + 1)
+        bottom = min(grid.shape[1], (view.bottom - 1) // TILE_SIZE + 1)
+        if left >= right or top >= bottom:
+            return
+
+        window = grid[left:right, top:bottom]
+        xs, ys = np.nonzero(window)
+        surface.blits([(self.images[kind], camera.transform_xy(x * TILE_SIZE, y * TILE_SIZE))
+                       for x, y, kind in zip((xs + left).tolist(), (ys + top).tolist(),
+                                             window[xs, ys].tolist())], False)
@@ -0,0 +1,215 @@
+import math
+
+import numpy as np
+import pygame as pg
+
+from game import kinds
+from game.settings import *
+from sprites import sprite_groups
+from sprites.door import Door
+
+
+class StreamingWorld:
+    """
+    Keeps sprites and triggers alive only in the chunks near the player and the camera
+
+    The map is split into chunks of chunk_tiles x chunk_tiles tiles. Entities of a chunk
+    are spawned when it comes within distance chunks of the player or into the camera view,
+    and destroyed when it moves out. Door states, activated text triggers and the items lying
+    on the floor of a chunk are kept across unloads.
+    """
+
+    def __init__(self, game, xs, ys, kind_column, dirs, triggers,
+                 chunk_tiles=STREAM_CHUNK_TILES, distance=STREAM_DISTANCE):
+        """
+        :param game: game in which the entities are spawned
+        :param xs: x coordinates of the map objects to be streamed, the player excluded
+        :param ys: y coordinates of the map objects
+        :param kind_column: kinds of the map objects
+        :param dirs: directions of the map objects
+        :param triggers: map triggers to be streamed
+        :param chunk_tiles: width and height of a chunk in tiles
+        :param distance: chunks loaded around the player chunk in each direction
+        """
+        self.game = game
+        self.chunk_tiles = chunk_tiles
+        self.distance = distance
+
+        self.__objects = {}  # chunk -> (xs, ys, kinds, dirs) of the map objects of the chunk
+        # sort the objects by chunk, then split the order where the chunk changes
+        chunkxs, chunkys = xs // chunk_tiles, ys // chunk_tiles
+        order = np.lexsort((chunkys, chunkxs))
+        chunk_keys = np.stack((chunkxs[order], chunkys[order]), axis=1)
+        starts = np.flatnonzero(np.any(np.diff(chunk_keys, axis=0) != 0, axis=1)) + 1
+        for indices in np.split(order, starts):
+            if len(indices):
+                chunk = (int(chunkxs[indices[0]]), int(chunkys[indices[0]]))
+                self.__objects[chunk] = (xs[indices], ys[indices], kind_column[indices], dirs[indices])
+
+        self.__triggers = triggers
+        self.__trigger_chunks = {}  # chunk -> indices of the map triggers overlapping the chunk
+        chunk_size = chunk_tiles * TILE_SIZE
+        for index, trigger in enumerate(triggers):
+            left, top = math.floor(trigger["x"] / chunk_size), math.floor(trigger["y"] / chunk_size)
+            right = math.floor((trigger["x"] + max(trigger["width"], 1) - 1) / chunk_size)
+            bottom = math.floor((trigger["y"] + max(trigger["height"], 1) - 1) / chunk_size)
+            for chunk in ((cx, cy) for cx in range(left, right + 1) for cy in range(top, bottom + 1)):
+                self.__trigger_chunks.setdefault(chunk, []).append(index)
+
+        self.__loaded = {}  # chunk -> sprites spawned for the chunk
+        # index -> [text trigger, loaded chunks it overlaps], a trigger lives while one of its chunks is loaded
+        self.__live_triggers = {}
+        self.__visited = set()  # chunks loaded at least once
+        self.__floor_items = {}  # chunk -> items left on the floor of the unloaded chunk
+        self.__open_doors = set()  # (x, y) of the doors open while their chunk was unloaded
+        self.__activated_triggers = set()  # indices of the text triggers already activated
+        self.__center = None  # (chunk, camera view) of the last update
+
+    def open_doors(self):
+        """
+        Produces the positions of the open doors, in loaded chunks or not
+        :return: set of (x, y)
+        """
+        open_doors = set(self.__open_doors)
+        for sprites in self.__loaded.values():
+            for sprite in sprites:
+                if isinstance(sprite, Door):
+                    if sprite.door_open:
+                        open_doors.add((sprite.x, sprite.y))
+                    else:
+                        open_doors.discard((sprite.x, sprite.y))
+        return open_doors
+
+    def activated_triggers(self):
+        """
+        Produces the indices of the activated map triggers, in loaded chunks or not
+        :return: set of indices
+        """
+        activated = set(self.__activated_triggers)
+        activated.update(index for index, (trigger, _) in self.__live_triggers.items() if trigger.activated)
+        return activated
+
+    def stashed_items(self):
+        """
+        Produces the items lying on the floor of the unloaded chunks
+        :return: list of items
+        """
+        return [item for items in self.__floor_items.values() for item in items]
+
+    def restore(self, open_doors, activated_triggers, floor_items):
+        """
+        Restores a saved state, must be called before the first update.
+        Open doors are seen through and walked on at once, their sprites are opened when their chunk loads
+        :param open_doors: (x, y) of the open doors
+        :param activated_triggers: indices of the activated map triggers
+        :param floor_items: items lying on the floor away from where the map puts them
+        :return: nothing
+        """
+        self.__open_doors = set()
+        for x, y in open_doors:
+            objects = self.__objects.get(self.chunk_of(x, y))
+            if objects is None:
+                continue
+            xs, ys, kind_column, _ = objects
+            if np.any((xs == x) & (ys == y) & (kind_column == kinds.DOOR)):
+                self.__open_doors.add((x, y))
+                self.game.set_visibility(x, y, True)
+                self.game.set_walkable(x, y, True)
+        self.__activated_triggers = set(activated_triggers)
+        for item in floor_items:
+            item.kill()
+            self.__floor_items.setdefault(self.chunk_of(item.x, item.y), []).append(item)
+
+    def chunk_of(self, tilex, tiley):
+        return math.floor(tilex) // self.chunk_tiles, math.floor(tiley) // self.chunk_tiles
+
+    def update(self, tilex, tiley, view=None):
+        """
+        Loads the chunks around the tile and the camera view, unloads the rest
+        :param tilex: x coordinate of the player in tiles
+        :param tiley: y coordinate of the player in tiles
+        :param view: camera view rectangle in the world coordinates, or None
+        :return: nothing
+        """
+        center = self.chunk_of(tilex, tiley)
+        view_chunks = self.__view_chunks(view) if view is not None else ()
+        if (center, view_chunks) == self.__center:
+            return
+        self.__center = (center, view_chunks)
+
+        wanted = {(center[0] + dx, center[1] + dy)
+                  for dx in range(-self.distance, self.distance + 1)
+                  for dy in range(-self.distance, self.distance + 1)}
+        wanted.update(view_chunks)
+
+        for chunk in [c for c in self.__loaded if c not in wanted]:
+            self.__unload(chunk)
+        for chunk in wanted:
+            if chunk not in self.__loaded:
+                self.__load(chunk)
+
+    def __view_chunks(self, view):
+        size = self.chunk_tiles * TILE_SIZE
+        return tuple((cx, cy)
+                     for cx in range(view.left // size, (view.right - 1) // size + 1)
+                     for cy in range(view.top // size, (view.bottom - 1) // size + 1))
+
+    def __load(self, chunk):
+        sprites = []
+
+        if chunk in self.__objects:
+            xs, ys, kind_column, dirs = self.__objects[chunk]
+            if chunk in self.__visited:
+                # items of a visited chunk come back from __floor_items
+                spawned = kind_column != kinds.APPLE
+                xs, ys, kind_column, dirs = xs[spawned], ys[spawned], kind_column[spawned], dirs[spawned]
+
+            for sprite in self.game.spawn_many(xs, ys, kind_column, dirs):
+                if isinstance(sprite, Door) and (sprite.x, sprite.y) in self.__open_doors:
+                    sprite.open_door()
+                sprites.append(sprite)
+
+        for item in self.__floor_items.pop(chunk, ()):
+            item.add(sprite_groups.all_sprites, sprite_groups.items_on_floor)
+            sprites.append(item)
+
+        for index in self.__trigger_chunks.get(chunk, ()):
+            live = self.__live_triggers.get(index)
+            if live is None:
+                trigger = self.game.spawn_trigger(self.__triggers[index])
+                trigger.activated = index in self.__activated_triggers
+                live = self.__live_triggers[index] = [trigger, 0]
+            live[1] += 1
+
+        self.__loaded[chunk] = sprites
+        self.__visited.add(chunk)
+
+    def __unload(self, chunk):
+        sprites = self.__loaded.pop(chunk)
+
+        for sprite in sprites:
+            if isinstance(sprite, Door):
+                if sprite.door_open:
+                    self.__open_doors.add((sprite.x, sprite.y))
+                else:
+                    self.__open_doors.discard((sprite.x, sprite.y))
+            if sprite not in sprite_groups.items_on_floor:
+                sprite.kill()  # picked up items are owned by their container
+
+        # items on the floor of the chunk, including the ones dropped there
+        size = self.chunk_tiles * TILE_SIZE
+        area = pg.Rect(chunk[0] * size, chunk[1] * size, size, size)
+        for item in sprite_groups.items_on_floor.query(area):
+            if self.chunk_of(item.x, item.y) == chunk:
+                item.kill()
+                self.__floor_items.setdefault(chunk, []).append(item)
+
+        for index in self.__trigger_chunks.get(chunk, ()):
+            live = self.__live_triggers[index]
+            live[1] -= 1
+            if live[1] == 0:
+                trigger = live[0]
+                if trigger.activated:
+                    self.__activated_triggers.add(index)
+                trigger.remove()
+                del self.__live_triggers[index]
@@ -0,0 +1,157 @@
+import csv
+import json
+import os
+import time
+from collections import deque
+
+from game.settings import STATS_HISTORY, STATS_DUMP_ROTATE_FRAMES
+
+
+class Instrumentation:
+    """
+    Named timing scopes and counters for the main loop, collected per frame
+    """
+
+    def __init__(self, history=STATS_HISTORY):
+        """
+        :param history: number of finished frames kept for averaging
+        """
+        self.enabled = False
+        self.frames = deque(maxlen=history)  # finished frames, {"times": {}, "counters": {}}
+
+        self.__times = {}  # name -> milliseconds spent in the current frame
+        self.__counters = {}  # name -> count in the current frame
+        self.__null_scope = _NullScope()
+
+        self.__dump_filename = None
+        self.__dump_file = None
+        self.__dump_writer = None
+        self.__dump_columns = None
+        self.__dumped_frames = 0
+
+    def scope(self, name):
+        """
+        Times the code inside the with statement
+        :param name: name of the scope, time of scopes with the same name is summed up
+        :return: context manager
+        """
+        if not self.enabled:
+            return self.__null_scope
+        return _Scope(self.__times, name)
+
+    def count(self, name, amount=1):
+        """
+        Increments the counter
+        :param name: name of the counter
+        :param amount: value added to the counter
+        :return: nothing
+        """
+        if self.enabled:
+            self.__counters[name] = self.__counters.get(name, 0) + amount
+
+    def end_frame(self):
+        """
+        Finishes the current frame, stores and dumps its measurements
+        :return: nothing
+        """
+        if not self.enabled:
+            return
+
+        frame = {"times": self.__times, "counters": self.__counters}
+        self.frames.append(frame)
+        self.__times = {}
+        self.__counters = {}
+
+        if self.__dump_filename is not None:
+            self.__dump(frame)
+
+    def averages(self):
+        """
+        Produces the average value of every scope and counter over the kept frames
+        :return: (times, counters) dicts
+        """
+        times, counters = {}, {}
+        for frame in self.frames:
+            for name, value in frame["times"].items():
+                times[name] = times.get(name, 0.0) + value
+            for name, value in frame["counters"].items():
+                counters[name] = counters.get(name, 0) + value
+
+        n = max(1, len(self.frames))
+        return ({name: value / n for name, value in times.items()},
+                {name: value / n for name, value in counters.items()})
+
+    def start_dump(self, filename):
+        """
+        Starts writing every frame to the file, as CSV or as JSON lines if the name ends with .jsonl.
+        The file is rotated to <filename>.1 every STATS_DUMP_ROTATE_FRAMES frames
+        :param filename: name of the dump file
+        :return: nothing
+        """
+        self.stop_dump()
+        self.__dump_filename = filename
+
+    def stop_dump(self):
+        if self.__dump_file is not None:
+            self.__dump_file.close()
+        self.__dump_filename = None
+        self.__dump_file = None
+        self.__dump_writer = None
+        self.__dump_columns = None
+        self.__dumped_frames = 0
+
+    def __dump(self, frame):
+        if self.__dumped_frames >= STATS_DUMP_ROTATE_FRAMES:
+            filename = self.__dump_filename
+            self.stop_dump()
+            os.replace(filename, filename + ".1")
+            self.__dump_filename = filename
+
+        row = {"time": time.time()}
+        row.update(("ms." + name, round(value, 4)) for name, value in frame["times"].items())
+        row.update(("n." + name, value) for name, value in frame["counters"].items())
+
+        if self.__dump_file is None:
+            self.__dump_file = open(self.__dump_filename, 'wt', newline='')
+
+        if self.__dump_filename.endswith(".jsonl"):
+            self.__dump_file.write(json.dumps(row) + "\n")
+        else:
+            if self.__dump_writer is None:
+                # columns are fixed by the first frame written to the file
+                self.__dump_columns = list(row)
+                self.__dump_writer = csv.DictWriter(self.__dump_file, self.__dump_columns,
+                                                    restval=0, extrasaction='ignore')
+                self.__dump_writer.writeheader()
+            self.__dump_writer.writerow(row)
+
+        self.__dumped_frames += 1
+
+
+class _Scope:
+    __slots__ = ("times", "name", "start")
+
+    def __init__(self, times, name):
+        self.times = times
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        elapsed = (time.perf_counter() - self.start) * 1000
+        self.times[self.name] = self.times.get(self.name, 0.0) + elapsed
+
+
+class _NullScope:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+# Shared by the whole game
+stats = Instrumentation()
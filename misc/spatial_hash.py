@@ -0,0 +1,94 @@
+import math
+
+
+class SpatialHash:
+    """
+    Uniform grid that buckets objects by the cells their rectangles overlap
+    """
+
+    def __init__(self, cell_size):
+        """
+        :param cell_size: width and height of a single cell in world coordinates
+        """
+        self.cell_size = cell_size
+        self.__cells = {}  # (cellx, celly) -> {obj: None}
+        self.__entries = {}  # obj -> cells occupied by the obj
+
+    def __contains__(self, obj):
+        return obj in self.__entries
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def cells_of(self, rect):
+        """
+        Produce the cells overlapped by the rectangle
+        :param rect: rectangle in world coordinates
+        :return: list of (cellx, celly) tuples
+        """
+        size = self.cell_size
+        left = math.floor(rect[0] / size)
+        top = math.floor(rect[1] / size)
+        # right and bottom edges are exclusive, same as in pygame.Rect
+        right = math.floor((rect[0] + max(rect[2], 1) - 1) / size)
+        bottom = math.floor((rect[1] + max(rect[3], 1) - 1) / size)
+
+        return [(cx, cy) for cx in range(left, right + 1) for cy in range(top, bottom + 1)]
+
+    def insert(self, obj, rect):
+        """
+        Puts the object into the cells overlapped by the rectangle,
+        replacing the previous position of the object if there was one
+        :param obj: hashable object
+        :param rect: rectangle of the object in world coordinates
+        :return: nothing
+        """
+        if obj in self.__entries:
+            self.remove(obj)
+
+        cells = self.cells_of(rect)
+        for cell in cells:
+            bucket = self.__cells.get(cell)
+            if bucket is None:
+                bucket = self.__cells[cell] = {}
+            bucket[obj] = None
+        self.__entries[obj] = cells
+
+    def remove(self, obj):
+        """
+        Removes the object from the grid, does nothing if it is not there
+        :param obj: object to be removed
+        :return: nothing
+        """
+        cells = self.__entries.pop(obj, None)
+        if cells is None:
+            return
+
+        for cell in cells:
+            bucket = self.__cells[cell]
+            del bucket[obj]
+            if not bucket:
+                del self.__cells[cell]
+
+    def query(self, rect):
+        """
+        Produces the objects that share at least one cell with the rectangle.
+        Objects are candidates only, their rectangles still have to be tested
+        :param rect: rectangle in world coordinates
+        :return: list of objects, each object appears once
+        """
+        cells = self.cells_of(rect)
+        if len(cells) == 1:
+            bucket = self.__cells.get(cells[0])
+            return list(bucket) if bucket else []
+
+        found = {}
+        for cell in cells:
+            bucket = self.__cells.get(cell)
+            if bucket:
+                found.update(bucket)
+        return list(found)
+
+    def clear(self):
+        self.__cells.clear()
+        self.__entries.clear()
@@ -16,8 +16,6 @@ class Nanogui:
         self.draw_elements = []
 
     def draw(self):
-        if len(self.draw_elements):
-            return
         for k, v in enumerate(self.draw_elements):
             v()
 
@@ -4,7 +4,7 @@ executables = [cx_Freeze.Executable("main.py")]
 
 cx_Freeze.setup(
     name="Cyberlab v0.1-demo",
-    options={"build_exe": {"packages": ["pygame"],
+    options={"build_exe": {"packages": ["pygame", "numpy"],
                            "include_files": ["assets"]}},
     executables=executables
 )
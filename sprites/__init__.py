@@ -1 +1 @@
-__all__ = ["door", "item", "player", "wall"]
\ No newline at end of file
+__all__ = ["door", "item", "player"]
\ No newline at end of file
@@ -13,7 +13,7 @@ class ActiveSprite(Sprite):
         """
         Moves this sprite by (x,y), checking for collisions
 
-        Sprite also can be moved by changing x and y fields directly
+        Sprite also can be moved by set_position
 
         :param dx: x shift
         :param dy: y shift
@@ -22,14 +22,13 @@ class ActiveSprite(Sprite):
         """
 
         if not self.get_obstacles(dx, dy):
-            self.x += dx
-            self.y += dy
+            self.set_position(self.x + dx, self.y + dy)
             return True
         else:
             if not self.get_obstacles(dx, 0):
-                self.x += dx
+                self.set_position(self.x + dx, self.y)
             elif not self.get_obstacles(0, dy):
-                self.y += dy
+                self.set_position(self.x, self.y + dy)
                 return True
             else:
                 return False
@@ -17,10 +17,10 @@ def move(center, shift):
 class Door(Sprite):
     def __init__(self, game, x, y, dir):
         self.door_img = {
-            "up": game.spritesheet.get_image_alpha_at_row_col(2, 0),
-            "right": game.spritesheet.get_image_alpha_at_row_col(3, 0),
-            "down": game.spritesheet.get_image_alpha_at_row_col(4, 0),
-            "left": game.spritesheet.get_image_alpha_at_row_col(5, 0)
+            "up": game.spritesheet.get_region("door_up"),
+            "right": game.spritesheet.get_region("door_right"),
+            "down": game.spritesheet.get_region("door_down"),
+            "left": game.spritesheet.get_region("door_left")
         }
         super().__init__(game, x, y, self.door_img[dir], (sprite_groups.doors, sprite_groups.solid))
 
@@ -39,8 +39,12 @@ class Door(Sprite):
 
         self.door_open = False
 
-        KeyButtonTrigger(self.game, self.get_rect().inflate(50, 50),
-                         self.switch_door, keys=[pg.K_RETURN], j_buttons=[J_BUTTONS['A']])
+        self.trigger = KeyButtonTrigger(self.game, self.get_rect().inflate(50, 50),
+                                        self.switch_door, keys=[pg.K_RETURN], j_buttons=[J_BUTTONS['A']])
+
+    def kill(self):
+        self.trigger.remove()
+        super().kill()
 
     def switch_door(self):
         if self.door_open:
@@ -65,6 +69,7 @@ class Door(Sprite):
 
         self.add(sprite_groups.solid)
         self.game.set_visibility(self.x, self.y, False)
+        self.game.set_walkable(self.x, self.y, False)
 
     def open_door(self):
         self.door_open = True
@@ -82,11 +87,13 @@ class Door(Sprite):
 
         self.remove(sprite_groups.solid)
         self.game.set_visibility(self.x, self.y, True)
+        self.game.set_walkable(self.x, self.y, True)
 
     def set_dir(self, dir):
         self.dir = dir
         self.set_image(self.door_img[dir])
         self.set_hit_rect(self.door_hit_rect[dir])
+        self.game.mark_dirty(self.get_image_rect())
 
     def set_image(self, img):
         self.image = img
@@ -7,3 +7,6 @@ class Item(Sprite):
         super().__init__(game, x, y, img, sprite_groups.items_on_floor)
 
         self.pickable = None
+
+        # tile of the map the item was spawned on, identifies the item in saves
+        self.origin = (x, y)
@@ -11,7 +11,8 @@ HITBOX_DOWN_SHIFT = -8
 
 class Player(ActiveSprite):
     def __init__(self, game, x, y):
-        self.idle_image = game.spritesheet.get_image_alpha_at_row_col(0, 1)
+        sheet = game.spritesheet
+        self.idle_image = sheet.get_region("player_idle_0")
         self.image = self.idle_image
         super().__init__(game, x, y, self.image)
 
@@ -24,32 +25,32 @@ class Player(ActiveSprite):
         self.animation_timer = 0.0
         self.idling_animation = Animation(
             0.50, PlayMode.LOOP,
-            game.spritesheet.get_image_alpha_at_row_col(0, 1),
-            game.spritesheet.get_image_alpha_at_row_col(1, 1)
+            sheet.get_region("player_idle_0"),
+            sheet.get_region("player_idle_1")
         )
         self.walking_animation_up = Animation(
             0.10, PlayMode.LOOP,
-            game.spritesheet.get_image_alpha_at_row_col(2, 1),
-            game.spritesheet.get_image_alpha_at_row_col(3, 1),
-            game.spritesheet.get_image_alpha_at_row_col(4, 1)
+            sheet.get_region("player_walk_up_0"),
+            sheet.get_region("player_walk_up_1"),
+            sheet.get_region("player_walk_up_2")
         )
         self.walking_animation_down = Animation(
             0.10, PlayMode.LOOP,
-            game.spritesheet.get_image_alpha_at_row_col(5, 1),
-            game.spritesheet.get_image_alpha_at_row_col(6, 1),
-            game.spritesheet.get_image_alpha_at_row_col(7, 1)
+            sheet.get_region("player_walk_down_0"),
+            sheet.get_region("player_walk_down_1"),
+            sheet.get_region("player_walk_down_2")
         )
         self.walking_animation_left = Animation(
             0.10, PlayMode.LOOP,
-            game.spritesheet.get_image_alpha_at_row_col(2, 2),
-            game.spritesheet.get_image_alpha_at_row_col(3, 2),
-            game.spritesheet.get_image_alpha_at_row_col(4, 2)
+            sheet.get_region("player_walk_left_0"),
+            sheet.get_region("player_walk_left_1"),
+            sheet.get_region("player_walk_left_2")
         )
         self.walking_animation_right = Animation(
             0.10, PlayMode.LOOP,
-            game.spritesheet.get_image_alpha_at_row_col(5, 2),
-            game.spritesheet.get_image_alpha_at_row_col(6, 2),
-            game.spritesheet.get_image_alpha_at_row_col(7, 2)
+            sheet.get_region("player_walk_right_0"),
+            sheet.get_region("player_walk_right_1"),
+            sheet.get_region("player_walk_right_2")
         )
 
         self.container = Container(self, 16)
@@ -62,8 +63,8 @@ class Player(ActiveSprite):
 
         self.vx, self.vy = 0, 0
 
-        keys = pg.key.get_pressed()
         game = self.game
+        keys = game.keys_pressed
 
         x_axis = game.get_axis(0)
         if abs(x_axis) < JOYSTICK_THRESHOLD:
@@ -146,9 +147,27 @@ class Player(ActiveSprite):
         if self.animation_timer >= 60:
             self.animation_timer = 0.0
 
+    def skip_time(self, seconds):
+        """
+        Advances the animation of the player standing still
+        :param seconds: time skipped
+        :return: nothing
+        """
+        self.animation_timer = (self.animation_timer + seconds) % 60
+        self.update_animation(0.0)
+
+    def animation_timeout(self):
+        """
+        Produces the time until the image of the player changes on its own
+        :return: seconds, 0 while walking, None if the image does not change
+        """
+        if self.is_moving():
+            return 0.0
+        return self.idling_animation.time_to_next_frame(self.animation_timer)
+
     def pickup_items(self, auto_pick=False):
-        items = [s for s in sprite_groups.items_on_floor if self.get_hit_rect().colliderect(s.get_hit_rect())]
-        for item in items:
+        # only the items on the tiles under the player
+        for item in sprite_groups.items_on_floor.query(self.get_hit_rect()):
             if item.pickable is not None:
                 if auto_pick is True and item.pickable.auto_pick is False:
                     continue
@@ -156,6 +175,7 @@ class Player(ActiveSprite):
                 # TODO move to pickable.py?
                 self.container.add(item.pickable)
                 item.remove(sprite_groups.all_sprites, sprite_groups.items_on_floor)
+                self.game.mark_dirty(item.get_image_rect())
 
     def drop_item(self):
         # drops first existing item
@@ -163,6 +183,7 @@ class Player(ActiveSprite):
         if pickable is not None:
             self.container.remove(pickable)
             item = pickable.owner
-            item.set_position(self.x, self.y)
+            item.set_position(self.x, self.y, False)
             item.add(sprite_groups.all_sprites, sprite_groups.items_on_floor)
+            self.game.mark_dirty(item.get_image_rect())
             self.game.text_queue.append("Dropping " + item.pickable.id + " ...")
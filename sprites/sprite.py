@@ -2,6 +2,7 @@ import pygame as pg
 
 from game.settings import TILE_SIZE, SLITHER_SPEED
 from misc import sgn
+from misc.instrumentation import stats
 from sprites import sprite_groups
 from triggers import Trigger
 
@@ -23,17 +24,26 @@ class Sprite(pg.sprite.Sprite):
         """
         self.game = game
 
-        self.groups = groups, sprite_groups.all_sprites
-        pg.sprite.Sprite.__init__(self, self.groups)
-
         self.image = img
         self.x = x
         self.y = y
 
+        # position before the last simulation step that moved this sprite
+        self.prev_x = x
+        self.prev_y = y
+        self.__moved_step = game.sim_step
+
         self.__hit_rect = self.image.get_rect()
         self.__hit_rect.x = 0
         self.__hit_rect.y = 0
 
+        # triggers touched by this sprite on the last collide_with_triggers
+        self.triggers_inside = {}
+
+        # position and hit rectangle must be known before joining the indexed groups
+        self.groups = groups, sprite_groups.all_sprites
+        pg.sprite.Sprite.__init__(self, self.groups)
+
     def on_hit(self):
         """
         This method is called each time something hits this sprite
@@ -50,6 +60,26 @@ class Sprite(pg.sprite.Sprite):
                        self.image.get_rect().x,
                        self.image.get_rect().y)
 
+    def get_image_rect(self):
+        """
+        Produce the rectangle covered by the image in the world coordinates
+        :return: image rectangle positioned in the world coordinates
+        """
+        return self.image.get_rect().move(self.x * TILE_SIZE, self.y * TILE_SIZE)
+
+    def get_draw_rect(self):
+        """
+        Produce the image rectangle in the world coordinates, interpolated between
+        the last two simulation steps
+        :return: image rectangle positioned in the world coordinates
+        """
+        x, y = self.x, self.y
+        alpha = self.game.sim_alpha
+        if alpha < 1 and self.__moved_step == self.game.sim_step:
+            x = self.prev_x + (x - self.prev_x) * alpha
+            y = self.prev_y + (y - self.prev_y) * alpha
+        return pg.Rect(x * TILE_SIZE, y * TILE_SIZE, self.image.get_width(), self.image.get_height())
+
     def get_hit_rect(self):
         """
         Produce the hit rectangle in the world coordinates
@@ -57,15 +87,23 @@ class Sprite(pg.sprite.Sprite):
         """
         return self.__hit_rect.move(self.x * TILE_SIZE, self.y * TILE_SIZE)
 
-    def set_position(self, x, y):
+    def set_position(self, x, y, interpolate=True):
         """
         Sets the position of this sprite explicitly
         :param x: x coordinate in tile units
         :param y: y coordinate in tile units
+        :param interpolate: false to jump to the position without rendering the way there
         :return: nothing
         """
+        if not interpolate:
+            self.prev_x, self.prev_y = x, y
+            self.__moved_step = self.game.sim_step
+        elif self.__moved_step != self.game.sim_step:
+            self.prev_x, self.prev_y = self.x, self.y
+            self.__moved_step = self.game.sim_step
         self.x = x
         self.y = y
+        sprite_groups.reindex(self)
 
     def get_obstacles(self, dx, dy):
         """
@@ -75,16 +113,15 @@ class Sprite(pg.sprite.Sprite):
         :return: obstacles in the way of sprite's movement
         """
 
-        return [s for s in sprite_groups.solid if
-                self.get_hit_rect()
-                    .move(3 * sgn(dx), 3 * sgn(dy))
-                    .colliderect(s.get_hit_rect())]
+        with stats.scope("collision"):
+            rect = self.get_hit_rect().move(3 * sgn(dx), 3 * sgn(dy))
+            return sprite_groups.solid.query(rect) + self.game.static_tiles.query(rect)
 
     # TODO: get rid of direction
     def there_is_space(self, sprite, direction):
         """
         Returns true if there is space in the direction given
-        :param sprite: sprite around which to search for space
+        :param sprite: sprite or static tile around which to search for space
         :param direction:
         :return:
         """
@@ -99,9 +136,7 @@ class Sprite(pg.sprite.Sprite):
         else:
             assert False
 
-        hits = [s for s in sprite_groups.solid if s.get_hit_rect().collidepoint(point)]
-
-        return not hits
+        return not sprite_groups.solid.query_point(point) and not self.game.static_tiles.query_point(point)
 
     def slither(self, direction):
         """Slithers the sprite along the hit in the direction with an opening"""
@@ -120,19 +155,34 @@ class Sprite(pg.sprite.Sprite):
             hit = hits[0]
             if direction == "right" or "left":
                 if self.there_is_space(hit, "up"):
-                    self.y += SLITHER_SPEED
+                    self.set_position(self.x, self.y + SLITHER_SPEED)
                 elif self.there_is_space(hit, "down"):
-                    self.y -= SLITHER_SPEED
+                    self.set_position(self.x, self.y - SLITHER_SPEED)
             elif direction == "up" or "down":
                 if self.there_is_space(hit, "right"):
-                    self.x += SLITHER_SPEED
+                    self.set_position(self.x + SLITHER_SPEED, self.y)
                 elif self.there_is_space(hit, "left"):
-                    self.x -= SLITHER_SPEED
+                    self.set_position(self.x - SLITHER_SPEED, self.y)
 
     def collide_with_triggers(self):
-        hits = [s for s in Trigger.triggers if self.get_rect().inflate(20, 20).colliderect(s.hit_rect)]
-        for hit in hits:
-            hit.on_hit()
+        """
+        Emits enter, stay and exit events for the triggers around this sprite
+        :return: nothing
+        """
+        with stats.scope("triggers"):
+            inside = dict.fromkeys(Trigger.query(self.get_rect().inflate(20, 20)))
+
+            for trigger in self.triggers_inside:
+                if trigger not in inside:
+                    trigger.on_exit(self)
+
+            for trigger in inside:
+                if trigger in self.triggers_inside:
+                    trigger.on_stay(self)
+                else:
+                    trigger.on_enter(self)
+
+            self.triggers_inside = inside
 
     def set_hit_rect(self, hit_rect):
         """
@@ -143,4 +193,5 @@ class Sprite(pg.sprite.Sprite):
         self.__hit_rect.left = hit_rect[0]
         self.__hit_rect.top = hit_rect[1]
         self.__hit_rect.width = hit_rect[2]
-        self.__hit_rect.height = hit_rect[3]
\ No newline at end of file
+        self.__hit_rect.height = hit_rect[3]
+        sprite_groups.reindex(self)
@@ -1,6 +1,139 @@
+import math
+from operator import methodcaller
+
 import pygame as pg
 
-all_sprites = pg.sprite.Group()
-solid = pg.sprite.Group()
-items_on_floor = pg.sprite.Group()
-doors = pg.sprite.Group()
\ No newline at end of file
+from game.settings import TILE_SIZE
+from misc.instrumentation import stats
+from misc.spatial_hash import SpatialHash
+
+
+class IndexedGroup(pg.sprite.Group):
+    """
+    A sprite group that keeps its sprites in a spatial hash of their rectangles
+    """
+
+    def __init__(self, name, *sprites, rect_func=methodcaller('get_hit_rect')):
+        """
+        :param name: name of the group, used in the instrumentation counters
+        :param sprites: initial sprites of the group
+        :param rect_func: produces the indexed rectangle of a sprite in the world coordinates,
+        hit rectangle by default
+        """
+        self.index = SpatialHash(TILE_SIZE)
+        self.rect_func = rect_func
+        self.candidates_counter = "candidates." + name
+        super().__init__(*sprites)
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.index.insert(sprite, self.rect_func(sprite))
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.index.remove(sprite)
+
+    def reindex(self, sprite):
+        """
+        Updates the position of the sprite in the index
+        :param sprite: sprite that has moved or changed its rectangle
+        :return: nothing
+        """
+        if sprite in self.index:
+            self.index.insert(sprite, self.rect_func(sprite))
+
+    def query(self, rect):
+        """
+        Produces the sprites whose indexed rectangles collide with the given rectangle
+        :param rect: rectangle in world coordinates
+        :return: list of colliding sprites
+        """
+        rect_func = self.rect_func
+        candidates = self.index.query(rect)
+        stats.count(self.candidates_counter, len(candidates))
+        return [s for s in candidates if rect.colliderect(rect_func(s))]
+
+    def query_point(self, point):
+        """
+        Produces the sprites whose indexed rectangles contain the given point
+        :param point: (x, y) in world coordinates
+        :return: list of sprites containing the point
+        """
+        rect_func = self.rect_func
+        return [s for s in self.index.query((point[0], point[1], 1, 1))
+                if rect_func(s).collidepoint(point)]
+
+
+class TileIndexedGroup(IndexedGroup):
+    """
+    An indexed group that also buckets its sprites by the tile their position is on,
+    several sprites can share a tile
+    """
+
+    def __init__(self, name, *sprites, rect_func=methodcaller('get_hit_rect')):
+        self.tiles = {}  # (tilex, tiley) -> {sprite: None}
+        self.__tile_of = {}  # sprite -> (tilex, tiley)
+        super().__init__(name, *sprites, rect_func=rect_func)
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.__insert_tile(sprite)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.__remove_tile(sprite)
+
+    def reindex(self, sprite):
+        super().reindex(sprite)
+        if sprite in self.__tile_of:
+            self.__remove_tile(sprite)
+            self.__insert_tile(sprite)
+
+    def on_tiles(self, xs, ys):
+        """
+        Produces the sprites positioned on the given tiles
+        :param xs: sequence of x coordinates in tiles
+        :param ys: sequence of y coordinates in tiles
+        :return: list of sprites, in the order of the tiles
+        """
+        tiles = self.tiles
+        sprites = [sprite for tile in zip(xs, ys) if tile in tiles for sprite in tiles[tile]]
+        stats.count(self.candidates_counter, len(sprites))
+        return sprites
+
+    def __insert_tile(self, sprite):
+        tile = (math.floor(sprite.x), math.floor(sprite.y))
+        bucket = self.tiles.get(tile)
+        if bucket is None:
+            bucket = self.tiles[tile] = {}
+        bucket[sprite] = None
+        self.__tile_of[sprite] = tile
+
+    def __remove_tile(self, sprite):
+        tile = self.__tile_of.pop(sprite, None)
+        if tile is None:
+            return
+        bucket = self.tiles[tile]
+        del bucket[sprite]
+        if not bucket:
+            del self.tiles[tile]
+
+
+# indexed by image rectangles, used to cull sprites outside the camera
+all_sprites = IndexedGroup("all_sprites", rect_func=methodcaller('get_image_rect'))
+solid = IndexedGroup("solid")
+# also indexed by tiles, drawn only on the tiles in the FOV
+items_on_floor = TileIndexedGroup("items_on_floor")
+doors = IndexedGroup("doors")
+
+indexed_groups = (all_sprites, solid, items_on_floor, doors)
+
+
+def reindex(sprite):
+    """
+    Updates the position of the sprite in every indexed group it belongs to
+    :param sprite: sprite that has moved or changed its hit rectangle
+    :return: nothing
+    """
+    for group in indexed_groups:
+        group.reindex(sprite)
@@ -0,0 +1,79 @@
+import random
+import unittest
+
+import numpy as np
+
+from game.grid import TileGrid
+from ui.fov import Fov, calc_fov, shadowcast_table
+
+RADII = list(range(1, 16)) + [20, 40]
+
+
+def random_visibility(rng, side):
+    visibility = [[rng.random() > 0.2 for _ in range(side)] for _ in range(side)]
+    for i in range(side):
+        visibility[i][0] = visibility[i][side - 1] = visibility[0][i] = visibility[side - 1][i] = False
+    return visibility
+
+
+def reference_fov(visibility, x, y, radius):
+    side = len(visibility)
+    return calc_fov(x, y, radius, visibility, [[False] * side for _ in range(side)])
+
+
+class TestShadowcastTable(unittest.TestCase):
+    def test_same_tiles_as_calc_fov(self):
+        rng = random.Random(1)
+        for radius in RADII:
+            side = 2 * radius + 8
+            visibility = random_visibility(rng, side)
+            grid = TileGrid(side, side)
+            grid.data[:] = visibility
+            table = shadowcast_table(radius)
+            for _ in range(10):
+                # calc_fov wraps around the map edges, keep the radius window inside the map
+                x, y = rng.randrange(radius, side - radius), rng.randrange(radius, side - radius)
+                if not visibility[x][y]:
+                    continue
+                lit = np.zeros((side, side), dtype=np.bool_)
+                lit[x, y] = True
+                for xs, ys in table.cast(grid, x, y):
+                    lit[xs, ys] = True
+                self.assertEqual(lit.tolist(), reference_fov(visibility, x, y, radius), (radius, x, y))
+
+
+class TestFov(unittest.TestCase):
+    def test_toggled_walls_recast_the_right_octants(self):
+        rng = random.Random(2)
+        for radius in RADII:
+            side = 2 * radius + 8
+            visibility = random_visibility(rng, side)
+            visibility_data = TileGrid(side, side)
+            visibility_data.data[:] = visibility
+            fov_data = TileGrid(side, side)
+            tile_versions = TileGrid(side, side, 0, np.int64)
+            fov = Fov(radius, visibility_data, fov_data, cache_size=4, tile_versions=tile_versions)
+
+            version = 0
+            observers = [(rng.randrange(radius, side - radius), rng.randrange(radius, side - radius))
+                         for _ in range(3)]
+            for _ in range(12):
+                # toggle a few walls near the observers, then look again from one of them
+                for _ in range(rng.randrange(3)):
+                    x, y = rng.randrange(1, side - 1), rng.randrange(1, side - 1)
+                    if (x, y) in observers:
+                        continue
+                    version += 1
+                    visibility[x][y] = not visibility[x][y]
+                    visibility_data[x, y] = visibility[x][y]
+                    tile_versions[x, y] = version
+
+                x, y = rng.choice(observers)
+                if not visibility[x][y]:
+                    continue
+                fov.update(x, y, version)
+                self.assertEqual(fov_data.data.tolist(), reference_fov(visibility, x, y, radius), (radius, x, y))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import random
+import unittest
+from collections import deque
+
+import numpy as np
+
+from game.grid import TileGrid
+from game.navigation import STEPS, Navigation
+
+
+def reachable(walkable, start):
+    """
+    Produces the tiles reachable from the start with the moves of the navigation
+    """
+    width, height = walkable.shape
+    seen = {start}
+    queue = deque([start])
+    while queue:
+        x, y = queue.popleft()
+        for dx, dy, _ in STEPS:
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < width and 0 <= ny < height) or not walkable[nx, ny] or (nx, ny) in seen:
+                continue
+            if dx and dy and not (walkable[nx, y] and walkable[x, ny]):
+                continue
+            seen.add((nx, ny))
+            queue.append((nx, ny))
+    return seen
+
+
+class TestNavigation(unittest.TestCase):
+    def assert_valid_path(self, walkable, path, start, goal):
+        width, height = walkable.shape
+        self.assertEqual(path[0], start)
+        self.assertEqual(path[-1], goal)
+        for (x, y), (nx, ny) in zip(path, path[1:]):
+            self.assertTrue(0 <= nx < width and 0 <= ny < height, (nx, ny))
+            self.assertTrue(walkable[nx, ny], (nx, ny))
+            self.assertLessEqual(max(abs(nx - x), abs(ny - y)), 1)
+            if nx != x and ny != y:
+                self.assertTrue(walkable[nx, y] and walkable[x, ny])
+
+    def check_queries(self, navigation, walkable, rng, count):
+        width, height = walkable.shape
+        for _ in range(count):
+            start = (rng.randrange(width), rng.randrange(height))
+            goal = (rng.randrange(width), rng.randrange(height))
+            path = navigation.path(start, goal)
+            if not walkable[start] or not walkable[goal]:
+                self.assertIsNone(path)
+                continue
+            if goal in reachable(walkable, start):
+                self.assertIsNotNone(path, (start, goal))
+                self.assert_valid_path(walkable, path, start, goal)
+            else:
+                self.assertIsNone(path, (start, goal))
+
+    def test_paths_match_reachability(self):
+        rng = random.Random(1)
+        for seed in range(5):
+            grid = TileGrid(37, 29, True)
+            grid.data[:] = np.random.RandomState(seed).rand(37, 29) > 0.3
+            navigation = Navigation(grid, cluster_tiles=10)
+            self.check_queries(navigation, grid.data, rng, 40)
+
+    def test_toggle_in_first_cluster_row_and_column(self):
+        # borders of the first clusters were rebuilt with neighbours at negative coordinates
+        rng = random.Random(2)
+        for seed in range(10):
+            grid = TileGrid(18, 46, True)
+            grid.data[:] = np.random.RandomState(seed).rand(18, 46) > 0.35
+            navigation = Navigation(grid, cluster_tiles=10)
+            for _ in range(20):
+                if rng.random() < 0.5:
+                    tile = (rng.randrange(10), rng.randrange(46))
+                else:
+                    tile = (rng.randrange(18), rng.randrange(10))
+                navigation.set_walkable(*tile, not grid.data[tile])
+                self.check_queries(navigation, grid.data, rng, 5)
+
+    def test_toggled_borders_match_a_fresh_navigation(self):
+        # borders are built on first use, dropped ones must come back as a fresh build finds them
+        rng = random.Random(3)
+        grid = TileGrid(45, 38, True)
+        grid.data[:] = np.random.RandomState(3).rand(45, 38) > 0.3
+        # without a cache, a path kept after a tile has opened could differ from the fresh one
+        navigation = Navigation(grid, cluster_tiles=10, cache_size=0)
+        for _ in range(30):
+            tile = (rng.randrange(45), rng.randrange(38))
+            navigation.set_walkable(*tile, not grid.data[tile])
+            fresh_grid = TileGrid(45, 38)
+            fresh_grid.data[:] = grid.data
+            fresh = Navigation(fresh_grid, cluster_tiles=10, cache_size=0)
+            for _ in range(5):
+                start = (rng.randrange(45), rng.randrange(38))
+                goal = (rng.randrange(45), rng.randrange(38))
+                self.assertEqual(navigation.path(start, goal), fresh.path(start, goal), (start, goal))
+
+
+if __name__ == '__main__':
+    unittest.main()
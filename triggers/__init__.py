@@ -1,13 +1,45 @@
+from itertools import count
+
 import pygame as pg
 
+from game.settings import TILE_SIZE
+from misc.spatial_hash import SpatialHash
+
+# Triggers are usually bigger than a tile, coarser cells keep them in fewer buckets
+TRIGGER_CELL_SIZE = 4 * TILE_SIZE
+
 
 class Trigger:
     triggers = []
+    index = SpatialHash(TRIGGER_CELL_SIZE)
+    __serials = count()
 
     def __init__(self, game, hit_rect):
         self.game = game
         self.hit_rect = hit_rect
+        self.serial = next(Trigger.__serials)
         Trigger.triggers.append(self)
+        Trigger.index.insert(self, hit_rect)
+
+    @staticmethod
+    def query(rect):
+        """
+        Produces the triggers colliding with the rectangle
+        :param rect: rectangle in world coordinates
+        :return: list of triggers in the order they were created
+        """
+        hits = [t for t in Trigger.index.query(rect) if rect.colliderect(t.hit_rect)]
+        hits.sort(key=lambda t: t.serial)
+        return hits
+
+    def remove(self):
+        """
+        Removes this trigger from the world
+        :return: nothing
+        """
+        if self in Trigger.index:
+            Trigger.triggers.remove(self)
+            Trigger.index.remove(self)
 
     def callback(self):
         pass
@@ -15,6 +47,27 @@ class Trigger:
     def on_hit(self):
         self.callback()
 
+    def on_enter(self, sprite):
+        """
+        Called when the sprite starts touching this trigger
+        :param sprite: sprite that has entered
+        """
+        self.on_hit()
+
+    def on_stay(self, sprite):
+        """
+        Called on each frame the sprite keeps touching this trigger after entering
+        :param sprite: sprite inside the trigger
+        """
+        pass
+
+    def on_exit(self, sprite):
+        """
+        Called when the sprite stops touching this trigger
+        :param sprite: sprite that has left
+        """
+        pass
+
 
 class KeyButtonTrigger(Trigger):
     def __init__(self, game, hit_rect, callback, keys, j_buttons = None):
@@ -34,6 +87,11 @@ class KeyButtonTrigger(Trigger):
                 self.callback()
                 return
 
+    def on_stay(self, sprite):
+        # nothing can be pressed on a frame without input
+        if self.game.keys_just_pressed or self.game.joystick_just_pressed:
+            self.on_hit()
+
 
 class TextTrigger(Trigger):
     def __init__(self, game, hit_rect, text):
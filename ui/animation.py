@@ -31,3 +31,11 @@ class Animation:
             frame_number = frame_number % len(self.key_frames)
 
         return frame_number
+
+    def time_to_next_frame(self, time):
+        # None when the key frame never changes again
+        if len(self.key_frames) == 1:
+            return None
+        if self.play_mode == PlayMode.NORMAL and int(time / self.frame_duration) >= len(self.key_frames) - 1:
+            return None
+        return self.frame_duration - time % self.frame_duration
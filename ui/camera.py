@@ -10,15 +10,23 @@ class Camera:
         self.height = height
 
     def transform(self, sprite):
-        return sprite.get_rect().move(self.rect.topleft)
+        return sprite.get_draw_rect().move(self.rect.topleft)
 
     def transform_xy(self, x, y):
         return self.rect.left + x, self.rect.top + y
 
-    # move camera in opposite direction
+    def get_view_rect(self):
+        """
+        Produce the part of the world visible on the screen
+        :return: screen rectangle in the world coordinates
+        """
+        return pg.Rect(-self.rect.left, -self.rect.top, SCREEN_WIDTH, SCREEN_HEIGHT)
+
+    # move camera in opposite direction, following the rendered position of the target
     def update(self, target):
-        x = -target.get_rect().x + int(SCREEN_WIDTH / 2)
-        y = -target.get_rect().y + int(SCREEN_HEIGHT / 2)
+        target_rect = target.get_draw_rect()
+        x = -target_rect.x + int(SCREEN_WIDTH / 2)
+        y = -target_rect.y + int(SCREEN_HEIGHT / 2)
 
         # limit scrolling near borders of map
         x = min(0, x)  # left
@@ -0,0 +1,48 @@
+import pygame as pg
+
+
+class DirtyRects:
+    """
+    Collects the screen regions changed during a frame and pushes only them to the display
+    """
+
+    def __init__(self, enabled):
+        """
+        :param enabled: if false, every frame is pushed with a full flip
+        """
+        self.enabled = enabled
+        self.__rects = []
+        self.__full = True
+
+    def add(self, rect):
+        """
+        Marks the screen region as changed
+        :param rect: rectangle in the screen coordinates
+        :return: nothing
+        """
+        if self.enabled and not self.__full:
+            self.__rects.append(pg.Rect(rect))
+
+    def add_full(self):
+        """
+        Marks the whole screen as changed
+        :return: nothing
+        """
+        self.__full = True
+        self.__rects.clear()
+
+    def is_full(self):
+        return not self.enabled or self.__full
+
+    def present(self):
+        """
+        Pushes the changed regions to the display and starts a new frame
+        :return: nothing
+        """
+        if self.is_full():
+            pg.display.flip()
+        elif self.__rects:
+            pg.display.update(self.__rects)
+
+        self.__rects.clear()
+        self.__full = False
@@ -1,3 +1,11 @@
+from bisect import bisect_left
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+from misc.instrumentation import stats
+
 # multipliers to transform coordinates into other octants
 MULT = [
   [1,  0,  0, -1, -1,  0,  0,  1],
@@ -30,6 +38,246 @@ def calc_fov(startx, starty, radius, visibility_data, fov_data):
     return fov_data
 
 
+class ShadowcastTable:
+    """
+    Shadowcasting with the cells of every octant precomputed for one radius
+
+    Gives the same tiles as calc_fov. For each octant and row the cells are
+    listed in the order cast_light visits them, with their slopes and their
+    index in the (2 * radius + 1) square window around the observer, so casting
+    is a loop over plain lists with an explicit stack instead of recursion.
+    Tiles outside the map are treated as blocking and are never lit.
+    """
+
+    def __init__(self, radius):
+        """
+        :param radius: FOV radius in tiles
+        """
+        self.radius = radius
+        self.size = 2 * radius + 1
+
+        # octant -> row -> [(window index, left slope, right slope, within radius)]
+        self.rows = []
+        # row -> negated right slopes of its cells, ascending, to skip the cells before the light start
+        self.skip = [[]] + [[-(dx + 0.5) / (-j - 0.5) for dx in range(-j, 1)] for j in range(1, radius + 1)]
+        radius_sqr = radius * radius
+        for octant in range(8):
+            xx, xy, yx, yy = MULT[0][octant], MULT[1][octant], MULT[2][octant], MULT[3][octant]
+            rows = [[]]
+            for j in range(1, radius + 1):
+                dy = -j
+                rows.append([((radius + dx * xx + dy * xy) * self.size + radius + dx * yx + dy * yy,
+                              (dx - 0.5) / (dy + 0.5),
+                              (dx + 0.5) / (dy - 0.5),
+                              dx * dx + dy * dy < radius_sqr)
+                             for dx in range(-j, 1)])
+            self.rows.append(rows)
+
+    def cast(self, visibility_data, startx, starty, octants=range(8)):
+        """
+        Produces the tiles lit in the octants around the observer
+        :param visibility_data: TileGrid, True if the tile can be seen through
+        :param startx: x coordinate of the observer in tiles
+        :param starty: y coordinate of the observer in tiles
+        :param octants: octants to be cast
+        :return: list of (xs, ys) arrays, one per octant in the order given
+        """
+        radius, size = self.radius, self.size
+        data = visibility_data.data
+        left, top = startx - radius, starty - radius
+        x0, y0 = max(0, left), max(0, top)
+        x1, y1 = min(data.shape[0], left + size), min(data.shape[1], top + size)
+        clipped = (x0, y0, x1, y1) != (left, top, left + size, top + size)
+        if clipped:
+            window = np.zeros((size, size), dtype=np.bool_)
+            window[x0 - left:x1 - left, y0 - top:y1 - top] = data[x0:x1, y0:y1]
+        else:
+            window = data[left:left + size, top:top + size]
+        visible = window.ravel().tolist()
+
+        lit, ends = [], []
+        for octant in octants:
+            self.__cast_octant(self.rows[octant], visible, lit)
+            ends.append(len(lit))
+
+        cells = np.array(lit, dtype=np.intp)
+        xs, ys = cells // size + left, cells % size + top
+        result = list(zip(np.split(xs, ends[:-1]), np.split(ys, ends[:-1])))
+        if clipped:
+            result = [(xs[inside], ys[inside]) for xs, ys in result
+                      for inside in [(xs >= x0) & (xs < x1) & (ys >= y0) & (ys < y1)]]
+        return result
+
+    def __cast_octant(self, rows, visible, lit):
+        radius = self.radius
+        skip = self.skip
+        stack = [(1, 1.0, 0.0)]  # (row, light start, light end) of the scans still to do
+        while stack:
+            row, light_start, light_end = stack.pop()
+            if light_start < light_end:
+                continue
+
+            new_start = 0.0
+            for j in range(row, radius + 1):
+                blocked = False
+                # cells before the first one with r_slope <= light_start are not lit
+                for index, l_slope, r_slope, in_radius in rows[j][bisect_left(skip[j], -light_start):]:
+                    if light_start < r_slope:
+                        continue
+                    elif light_end > l_slope:
+                        break
+
+                    if in_radius:
+                        lit.append(index)
+
+                    if blocked:
+                        if not visible[index]:
+                            new_start = r_slope
+                        else:
+                            blocked = False
+                            light_start = new_start
+                    elif not visible[index] and j < radius:
+                        blocked = True
+                        stack.append((j + 1, light_start, l_slope))
+                        new_start = r_slope
+
+                if blocked:
+                    break
+
+
+@lru_cache(maxsize=None)
+def shadowcast_table(radius):
+    """
+    Produces the shared shadowcasting table of the radius, built on first use
+    :param radius: FOV radius in tiles
+    :return: ShadowcastTable
+    """
+    return ShadowcastTable(radius)
+
+
+class Fov:
+    """
+    Incremental FOV engine
+
+    Keeps the tiles lit by the last computation so that only those tiles and
+    the tiles in the new radius window are touched when the observer moves.
+    Results are cached per tile and per octant. When tile versions are given,
+    a visibility change only recomputes the octants of the cached results that
+    contain the changed tile, otherwise any change recomputes everything.
+    """
+
+    def __init__(self, radius, visibility_data, fov_data, cache_size=256, tile_versions=None):
+        """
+        :param radius: FOV radius in tiles
+        :param visibility_data: TileGrid, True if the tile can be seen through
+        :param fov_data: TileGrid, True if the tile is in the FOV, written in place
+        :param cache_size: maximum number of cached results
+        :param tile_versions: TileGrid, visibility version of the last change of each tile
+        """
+        self.radius = radius
+        self.visibility_data = visibility_data
+        self.fov_data = fov_data
+        self.cache_size = cache_size
+        self.tile_versions = tile_versions
+        self.__table = shadowcast_table(radius)
+
+        self.__cache = OrderedDict()  # (tilex, tiley) -> [version, lit tiles of each octant]
+        self.__lit = None  # (xs, ys) of the tiles lit by the last computation, None if unknown
+        self.__key = None  # (tilex, tiley, version) of the last computation
+
+    def update(self, tilex, tiley, version):
+        """
+        Recomputes the FOV of the observer standing at the given tile
+        :param tilex: x coordinate of the observer in tiles
+        :param tiley: y coordinate of the observer in tiles
+        :param version: visibility version, must change whenever visibility_data changes
+        :return: true if fov_data has changed, false otherwise
+        """
+        key = (tilex, tiley, version)
+        if key == self.__key:
+            return False
+
+        if not self.visibility_data[tilex, tiley]:
+            return False
+
+        entry = self.__cache.get((tilex, tiley))
+        if entry is None:
+            entry = [version, self.__table.cast(self.visibility_data, tilex, tiley)]
+            stats.count("fov_octants_cast", 8)
+            self.__cache[(tilex, tiley)] = entry
+            if len(self.__cache) > self.cache_size:
+                self.__cache.popitem(last=False)
+            recast = True
+        else:
+            self.__cache.move_to_end((tilex, tiley))
+            stale = self.__stale_octants(tilex, tiley, entry[0]) if entry[0] != version else ()
+            for octant, lit in zip(stale, self.__table.cast(self.visibility_data, tilex, tiley, stale)):
+                entry[1][octant] = lit
+            stats.count("fov_octants_cast", len(stale))
+            entry[0] = version
+            recast = bool(stale)
+
+        if not recast and self.__key is not None and self.__key[:2] == (tilex, tiley):
+            # the changes are out of sight
+            self.__key = key
+            return False
+
+        octants = entry[1]
+        lit = (np.concatenate([xs for xs, _ in octants] + [np.array([tilex], dtype=np.intp)]),
+               np.concatenate([ys for _, ys in octants] + [np.array([tiley], dtype=np.intp)]))
+
+        if self.__lit is None:
+            self.fov_data.fill(False)
+        else:
+            self.fov_data.set_many(*self.__lit, False)
+        self.fov_data.set_many(*lit, True)
+
+        self.__lit = lit
+        self.__key = key
+        return True
+
+    def lit_count(self):
+        """
+        Produces the number of tile entries lit by the last computation,
+        tiles on the octant borders are counted twice
+        :return: number of lit tiles
+        """
+        return 0 if self.__lit is None else len(self.__lit[0])
+
+    def invalidate(self):
+        """
+        Forces full recomputation on the next update
+        :return: nothing
+        """
+        self.__cache.clear()
+        self.__lit = None
+        self.__key = None
+
+    def __stale_octants(self, tilex, tiley, version):
+        """
+        Produces the octants around the tile that contain tiles changed after the version
+        """
+        if self.tile_versions is None:
+            return range(8)
+
+        radius = self.radius
+        left, top = max(0, tilex - radius), max(0, tiley - radius)
+        window = self.tile_versions.data[left:tilex + radius + 1, top:tiley + radius + 1]
+        xs, ys = np.nonzero(window > version)
+        if len(xs) == 0:
+            return ()
+
+        # back into the octant coordinates of cast_light, the transforms are their own transposes
+        offsetxs, offsetys = xs + left - tilex, ys + top - tiley
+        stale = []
+        for octant in range(8):
+            dxs = offsetxs * MULT[0][octant] + offsetys * MULT[2][octant]
+            dys = offsetxs * MULT[1][octant] + offsetys * MULT[3][octant]
+            if np.any((dys < 0) & (dys <= dxs) & (dxs <= 0)):
+                stale.append(octant)
+        return stale
+
+
 def cast_light(cx, cy, row, light_start, light_end, radius, xx, xy, yx, yy, light_func, blocked_func):
     new_start = 0.0
     if light_start < light_end:
@@ -0,0 +1,196 @@
+"""
+FOV of many observers at once
+
+All observers of a batch look at the same visibility snapshot. Each result is a
+FovMask, the tiles seen by the observer packed as bits of the square window
+around it. Big batches are split over a pool of processes that read the
+snapshot from shared memory instead of receiving a copy each.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from game.grid import TileGrid
+from game.settings import FOV_POOL_THRESHOLD, FOV_POOL_WORKERS
+from ui.fov import shadowcast_table
+
+
+class FovMask:
+    """
+    Tiles seen by one observer
+    """
+    __slots__ = ("left", "top", "size", "bits")
+
+    def __init__(self, left, top, size, bits):
+        """
+        :param left: x coordinate of the window in tiles
+        :param top: y coordinate of the window in tiles
+        :param size: width and height of the window in tiles
+        :param bits: window packed by np.packbits, indexed [x, y], empty if nothing is seen
+        """
+        self.left = left
+        self.top = top
+        self.size = size
+        self.bits = bits
+
+    def window(self):
+        """
+        Produces the window around the observer
+        :return: boolean array of size x size, indexed [x, y]
+        """
+        if not self.bits:
+            return np.zeros((self.size, self.size), dtype=np.bool_)
+        cells = np.unpackbits(np.frombuffer(self.bits, dtype=np.uint8), count=self.size * self.size)
+        return cells.reshape(self.size, self.size).astype(np.bool_)
+
+    def tiles(self):
+        """
+        Produces the tiles seen by the observer
+        :return: (xs, ys) arrays in tiles
+        """
+        xs, ys = np.nonzero(self.window())
+        return xs + self.left, ys + self.top
+
+    def __contains__(self, tile):
+        x, y = tile[0] - self.left, tile[1] - self.top
+        if not self.bits or not (0 <= x < self.size and 0 <= y < self.size):
+            return False
+        index = x * self.size + y
+        return bool(self.bits[index >> 3] & (0x80 >> (index & 7)))
+
+    def __len__(self):
+        return int(np.unpackbits(np.frombuffer(self.bits, dtype=np.uint8)).sum()) if self.bits else 0
+
+
+def observer_fov(visibility_data, tilex, tiley, radius):
+    """
+    Produces the tiles seen by one observer, the same tiles as calc_fov
+    :param visibility_data: TileGrid, True if the tile can be seen through
+    :param tilex: x coordinate of the observer in tiles
+    :param tiley: y coordinate of the observer in tiles
+    :param radius: FOV radius in tiles
+    :return: FovMask, empty if the observer stands on a blocking tile
+    """
+    size = 2 * radius + 1
+    left, top = tilex - radius, tiley - radius
+    if not visibility_data[tilex, tiley]:
+        return FovMask(left, top, size, b"")
+
+    window = np.zeros((size, size), dtype=np.bool_)
+    window[radius, radius] = True
+    for xs, ys in shadowcast_table(radius).cast(visibility_data, tilex, tiley):
+        window[xs - left, ys - top] = True
+    return FovMask(left, top, size, np.packbits(window).tobytes())
+
+
+def batch_fov(visibility_data, observers):
+    """
+    Produces the tiles seen by each observer in the calling process
+    :param visibility_data: TileGrid, True if the tile can be seen through
+    :param observers: list of (tilex, tiley, radius)
+    :return: list of FovMask in the order of the observers
+    """
+    return [observer_fov(visibility_data, tilex, tiley, radius) for tilex, tiley, radius in observers]
+
+
+# worker side: shared memory name -> (shared memory, TileGrid over it) of the attached snapshot
+_attached = {}
+
+
+def _attach(name, shape):
+    if name not in _attached:
+        for shm, _ in _attached.values():
+            shm.close()
+        _attached.clear()
+
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # before python 3.13 the block is registered again with the resource tracker
+            # shared with the owner, which unregisters it once when unlinking
+            shm = shared_memory.SharedMemory(name=name)
+
+        grid = TileGrid(0, 0)
+        grid.data = np.ndarray(shape, dtype=np.bool_, buffer=shm.buf)
+        _attached[name] = (shm, grid)
+    return _attached[name][1]
+
+
+def _batch_fov_shared(name, shape, observers):
+    grid = _attach(name, shape)
+    return [(mask.left, mask.top, mask.size, mask.bits) for mask in batch_fov(grid, observers)]
+
+
+class FovPool:
+    """
+    Computes big FOV batches in a pool of processes
+
+    The visibility snapshot is copied into shared memory once per version,
+    batches smaller than the threshold are computed in the calling process.
+    """
+
+    def __init__(self, workers=FOV_POOL_WORKERS, threshold=FOV_POOL_THRESHOLD):
+        """
+        :param workers: number of processes, one per CPU if None
+        :param threshold: smallest batch sent to the processes
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.threshold = threshold
+
+        self.__pool = None  # started on the first big batch
+        self.__shm = None  # shared memory holding the snapshot
+        self.__shape = None
+        self.__version = None  # visibility version of the snapshot
+
+    def compute(self, visibility_data, observers, version=None):
+        """
+        Produces the tiles seen by each observer
+        :param visibility_data: TileGrid, True if the tile can be seen through
+        :param observers: list of (tilex, tiley, radius)
+        :param version: visibility version, the snapshot is copied again when it changes or is None
+        :return: list of FovMask in the order of the observers
+        """
+        if len(observers) < self.threshold:
+            return batch_fov(visibility_data, observers)
+
+        if self.__pool is None:
+            self.__pool = ProcessPoolExecutor(self.workers)
+        self.__share(visibility_data, version)
+
+        chunk_size = -(-len(observers) // self.workers)
+        futures = [self.__pool.submit(_batch_fov_shared, self.__shm.name, self.__shape,
+                                      observers[start:start + chunk_size])
+                   for start in range(0, len(observers), chunk_size)]
+        return [FovMask(*mask) for future in futures for mask in future.result()]
+
+    def close(self):
+        """
+        Stops the processes and frees the shared memory
+        :return: nothing
+        """
+        if self.__pool is not None:
+            self.__pool.shutdown()
+            self.__pool = None
+        if self.__shm is not None:
+            self.__shm.close()
+            self.__shm.unlink()
+            self.__shm = None
+
+    def __share(self, visibility_data, version):
+        data = visibility_data.data
+        if self.__shm is not None and (data.shape != self.__shape or data.nbytes > self.__shm.size):
+            self.__shm.close()
+            self.__shm.unlink()
+            self.__shm = None
+
+        if self.__shm is None:
+            # a new name for every block, the processes attach to it on their next batch
+            self.__shm = shared_memory.SharedMemory(create=True, size=max(1, data.nbytes))
+            self.__shape = data.shape
+        elif version is not None and version == self.__version:
+            return
+
+        np.ndarray(data.shape, dtype=np.bool_, buffer=self.__shm.buf)[:] = data
+        self.__version = version
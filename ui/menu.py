@@ -1,11 +1,15 @@
 import sys
 import time
+from os import path
 
 import pygame as pg
 
+from game.assets import AssetLoader
 from game.game import Game
+from game.save import read_save
 from game.settings import *
 from nanogui import Nanogui
+from ui.text import text_renderer
 
 OPTION_COLOR = (231, 100, 240)
 
@@ -15,9 +19,16 @@ INITIAL_V_GAP = 30
 
 V_SPACING = 5
 
+NEW_GAME_MAP = "map1"
+
+# Seconds before a held joystick axis moves the selection again
+JOYSTICK_REPEAT_DELAY = 0.3
+
+LOADING_BAR_RECT = pg.Rect(SCREEN_WIDTH // 4, SCREEN_HEIGHT - 60, SCREEN_WIDTH // 2, 12)
+
 
 class Menu:
-    def __init__(self, menu, display):
+    def __init__(self, menu, display, assets=None):
         self.clock = pg.time.Clock()
         self.dt = 0.0
         self.playing = True
@@ -31,6 +42,9 @@ class Menu:
         self.menu = menu
         self.gui = Nanogui()
 
+        # assets loaded in the background while the menu is shown
+        self.assets = assets
+
         self.joysticks = [pg.joystick.Joystick(x) for x in range(pg.joystick.get_count())]
         self.joystick = None
         if len(self.joysticks) > 0:
@@ -38,20 +52,46 @@ class Menu:
             self.joystick.init()
 
         self.last_axis_motion = 0.0
+        self.waited_events = []  # events that ended an idle wait, handled with the next ones
 
     def run(self):
         self.draw()  # __draw__ first time to ignore self.updated
         while self.playing:
             self.dt = self.clock.tick(FPS) / 1000
+            if ADAPTIVE_PACING:
+                self.wait_for_input()
             self.events()
             self.update()
             self.draw()
 
+    def idle_timeout(self):
+        """
+        Produces how long the menu can block waiting for input, it only changes on input
+        and when a held joystick axis repeats
+        :return: seconds
+        """
+        if self.joystick is not None and abs(self.joystick.get_axis(1)) > JOYSTICK_THRESHOLD:
+            return max(0.0, self.last_axis_motion + JOYSTICK_REPEAT_DELAY - time.time())
+        return IDLE_MAX_WAIT
+
+    def wait_for_input(self):
+        """
+        Blocks until an event arrives or the menu has something to do
+        :return: nothing
+        """
+        timeout = self.idle_timeout()
+        if timeout > 0:
+            event = pg.event.wait(max(1, int(timeout * 1000)))
+            if event.type != pg.NOEVENT:
+                self.waited_events.append(event)
+
     def events(self):
         self.updated = False
         action = None
 
-        for event in pg.event.get():
+        events = self.waited_events + pg.event.get()
+        self.waited_events = []
+        for event in events:
             if event.type == pg.QUIT:
                 quit_game(self)
             if event.type == pg.KEYDOWN:
@@ -68,7 +108,7 @@ class Menu:
                     action = 'enter'
             if event.type == pg.JOYAXISMOTION:
                 if event.dict['axis'] == 1:
-                    if time.time() >= self.last_axis_motion + 0.3:
+                    if time.time() >= self.last_axis_motion + JOYSTICK_REPEAT_DELAY:
                         if event.dict['value'] < -JOYSTICK_THRESHOLD:
                             action = 'up'
                             self.last_axis_motion = time.time()
@@ -76,6 +116,17 @@ class Menu:
                             action = 'down'
                             self.last_axis_motion = time.time()
 
+        # a held axis sends no more events, it repeats once the delay has passed
+        if action is None and self.joystick is not None and \
+                time.time() >= self.last_axis_motion + JOYSTICK_REPEAT_DELAY:
+            value = self.joystick.get_axis(1)
+            if value < -JOYSTICK_THRESHOLD:
+                action = 'up'
+                self.last_axis_motion = time.time()
+            elif value > JOYSTICK_THRESHOLD:
+                action = 'down'
+                self.last_axis_motion = time.time()
+
         if action == 'down':
             self.menu["selected_option"] += 1
             self.menu["selected_option"] %= len(self.menu["options"])
@@ -106,7 +157,7 @@ class Menu:
             else:
                 color = OPTION_COLOR
 
-            rend = self.font.render(option["name"], True, color)
+            rend = text_renderer.render(self.font, option["name"], color)
             rect = rend.get_rect().move(
                 SCREEN_WIDTH // 2 - rend.get_width() // 2,
                 INITIAL_V_GAP + (rend.get_height() + V_SPACING) * count)
@@ -115,23 +166,62 @@ class Menu:
 
             count += 1
 
+    def wait_for_assets(self):
+        """
+        Shows a loading bar until the background loader is done
+        :return: nothing
+        """
+        while not self.assets.done():
+            pg.event.pump()
+            loaded, total = self.assets.progress()
+            self.display.fill(BG_COLOR)
+            self.draw_options()
+            pg.draw.rect(self.display, OPTION_COLOR, LOADING_BAR_RECT, 1)
+            progress_rect = LOADING_BAR_RECT.copy()
+            progress_rect.width = LOADING_BAR_RECT.width * loaded // max(total, 1)
+            self.display.fill(SELECTED_OPTION_COLOR, progress_rect)
+            pg.display.flip()
+            self.clock.tick(FPS)
+
 
 def new_game(self):
     self.playing = False
 
-    game = Game(self.display)
-    game.load("map1")
+    if self.assets is not None:
+        self.wait_for_assets()
+    game = Game(self.display, self.assets)
+    game.load(NEW_GAME_MAP)
     game.run()
 
 
 def quit_game(self):
+    if self.assets is not None:
+        self.assets.shutdown()
     pg.quit()
     sys.exit()
 
 
 def load_game(self):
-    print("LOAD GAME")
-    # TODO: finish load game option
+    if not path.exists(SAVE_FILE):
+        return
+
+    try:
+        state = read_save(SAVE_FILE)
+    except (OSError, ValueError):
+        # a save that cannot be read is the same as no saved game
+        return
+
+    if self.assets is not None:
+        self.wait_for_assets()
+    game = Game(self.display, self.assets)
+    try:
+        game.load(state["map"], state)
+    except (OSError, ValueError):
+        # the map of the save is gone or has changed
+        self.updated = True
+        return
+    self.playing = False
+    game.run()
 
 
 def settings(self):
@@ -140,6 +230,9 @@ def settings(self):
 
 
 def main_menu(display):
+    assets = AssetLoader()
+    assets.prefetch_game(NEW_GAME_MAP)
+
     return Menu({
         "selected_option": 0,
         "options": [
@@ -160,4 +253,4 @@ def main_menu(display):
                 "func": quit_game
             },
         ]
-    }, display)
+    }, display, assets)
@@ -1,23 +1,86 @@
+import json
+from os import path
+
 import pygame as pg
 
 
 class Spritesheet:
-    def __init__(self, filename, tile_size):
-        self.sheet = pg.image.load(filename).convert_alpha()
+    """
+    Cuts images out of a sheet. Every cell and region is cut once and the
+    same converted surface is shared by all the callers, so it must not be modified
+    """
+
+    def __init__(self, filename, tile_size, atlas=None, sheet=None):
+        """
+        :param filename: image of the sheet
+        :param tile_size: width and height of a cell in pixels
+        :param atlas: json description of the named regions, defaults to the sheet
+        file name with the .json extension if such a file exists
+        :param sheet: surface of the sheet already loaded from filename, if any
+        """
+        self.sheet = sheet if sheet is not None else pg.image.load(filename).convert_alpha()
         self.tile_size = tile_size
 
+        self.__images = {}  # (x, y, width, height, alpha) -> shared surface
+        self.regions = {}  # name -> (x, y, width, height, alpha)
+
+        if atlas is None and path.exists(path.splitext(filename)[0] + '.json'):
+            atlas = path.splitext(filename)[0] + '.json'
+        if atlas is not None:
+            self.load_atlas(atlas)
+
+    def load_atlas(self, filename):
+        """
+        Adds the named regions described in the atlas file
+
+        The file looks like {"tile_size": 32, "regions": {"wall": {"col": 0, "row": 0, "alpha": false}}},
+        a region may also be given in pixels as {"rect": [x, y, width, height]}. Regions have alpha by default
+        :param filename: name of the atlas file
+        :return: nothing
+        """
+        with open(filename, 'rt') as f:
+            atlas = json.loads(f.read())
+
+        tile_size = atlas.get("tile_size", self.tile_size)
+        for name, region in atlas["regions"].items():
+            if "rect" in region:
+                x, y, width, height = region["rect"]
+            else:
+                x, y = region["col"] * tile_size, region["row"] * tile_size
+                width = height = tile_size
+            self.regions[name] = (x, y, width, height, region.get("alpha", True))
+
+    def get_region(self, name):
+        """
+        Produces the image of the named region
+        :param name: name of the region in the atlas
+        :return: shared surface
+        """
+        return self.__get(*self.regions[name])
+
     def get_image(self, x, y, width, height):
-        image = pg.Surface((width, height))
-        image.blit(self.sheet, (0, 0), (x, y, width, height))
-        return image
+        return self.__get(x, y, width, height, False)
 
     def get_image_alpha(self, x, y, width, height):
-        image = pg.Surface((width, height), pg.SRCALPHA)
-        image.blit(self.sheet, (0, 0), (x, y, width, height))
-        return image
+        return self.__get(x, y, width, height, True)
 
     def get_image_at_row_col(self, col, row):
         return self.get_image(col * self.tile_size, row * self.tile_size,  self.tile_size,  self.tile_size)
 
     def get_image_alpha_at_row_col(self, col, row):
         return self.get_image_alpha(col * self.tile_size, row  * self.tile_size, self.tile_size, self.tile_size)
+
+    def __get(self, x, y, width, height, alpha):
+        key = (x, y, width, height, alpha)
+        image = self.__images.get(key)
+        if image is None:
+            if alpha:
+                image = pg.Surface((width, height), pg.SRCALPHA)
+                image.blit(self.sheet, (0, 0), (x, y, width, height))
+                image = image.convert_alpha()
+            else:
+                image = pg.Surface((width, height))
+                image.blit(self.sheet, (0, 0), (x, y, width, height))
+                image = image.convert()
+            self.__images[key] = image
+        return image
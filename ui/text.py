@@ -0,0 +1,109 @@
+from collections import OrderedDict
+
+from game.settings import TEXT_CACHE_SIZE
+
+
+class TextRenderer:
+    """
+    Renders text through an LRU cache of surfaces, so that a string
+    is rasterised once and then only blitted
+    """
+
+    def __init__(self, max_size=TEXT_CACHE_SIZE):
+        """
+        :param max_size: maximum number of cached surfaces and of cached layouts
+        """
+        self.max_size = max_size
+        self.__surfaces = OrderedDict()  # (font, text, color, antialias) -> surface
+        self.__layouts = OrderedDict()  # (font, text, color, antialias, width, spacing) -> lines
+
+    def render(self, font, text, color, antialias=True):
+        """
+        Produces the rendered text, same as font.render
+        :param font: pygame font
+        :param text: single line of text
+        :param color: (r, g, b) color of the text
+        :param antialias: true for smooth edges
+        :return: surface with the text, shared between callers, must not be modified
+        """
+        key = (font, text, tuple(color), antialias)
+        surface = self.__surfaces.get(key)
+        if surface is None:
+            surface = font.render(text, antialias, color)
+            self.__store(self.__surfaces, key, surface)
+        else:
+            self.__surfaces.move_to_end(key)
+        return surface
+
+    def layout(self, font, text, color, width, antialias=True, spacing=0):
+        """
+        Word-wraps the text into lines not wider than the given width.
+        The layout is computed once per message
+        :param font: pygame font
+        :param text: text to be wrapped
+        :param color: (r, g, b) color of the text
+        :param width: maximum width of a line in pixels
+        :param antialias: true for smooth edges
+        :param spacing: extra vertical space between lines in pixels
+        :return: list of (surface, (dx, dy)) lines, offsets are relative to the top left corner
+        """
+        key = (font, text, tuple(color), antialias, width, spacing)
+        lines = self.__layouts.get(key)
+        if lines is None:
+            lines = []
+            dy = 0
+            for line in wrap(font, text, width):
+                surface = self.render(font, line, color, antialias)
+                lines.append((surface, (0, dy)))
+                dy += font.get_linesize() + spacing
+            self.__store(self.__layouts, key, lines)
+        else:
+            self.__layouts.move_to_end(key)
+        return lines
+
+    def blit_layout(self, surface, lines, position):
+        """
+        Draws the lines produced by layout
+        :param surface: surface to draw on
+        :param lines: lines produced by layout
+        :param position: (x, y) of the top left corner of the text
+        :return: nothing
+        """
+        x, y = position
+        surface.blits([(line, (x + dx, y + dy)) for line, (dx, dy) in lines], False)
+
+    def clear(self):
+        self.__surfaces.clear()
+        self.__layouts.clear()
+
+    def __store(self, cache, key, value):
+        cache[key] = value
+        if len(cache) > self.max_size:
+            cache.popitem(last=False)
+
+
+def wrap(font, text, width):
+    """
+    Splits the text into lines not wider than the width, breaking on spaces.
+    Explicit line breaks are kept, a word wider than the width gets its own line
+    :param font: pygame font used to measure the text
+    :param text: text to be wrapped
+    :param width: maximum width of a line in pixels
+    :return: list of lines
+    """
+    lines = []
+    for paragraph in text.split("\n"):
+        line = ""
+        for word in paragraph.split(" "):
+            candidate = word if not line else line + " " + word
+            if line and font.size(candidate)[0] > width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+    return lines
+
+
+# Shared by the game and the menus
+text_renderer = TextRenderer()
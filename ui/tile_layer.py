@@ -0,0 +1,97 @@
+from collections import OrderedDict
+
+import numpy as np
+import pygame as pg
+
+from game.settings import *
+
+
+class StaticTileLayer:
+    """
+    Tiles of a static tile store, baked into cached chunk surfaces
+
+    Each chunk covers chunk_tiles x chunk_tiles map tiles. Drawing the layer
+    blits only the chunks that intersect the camera, and a chunk is re-baked
+    from the store when one of its tiles has changed. The least recently drawn
+    chunks are dropped once more than max_chunks are cached, and baked again
+    when they come back into view.
+    """
+
+    def __init__(self, store, chunk_tiles=STATIC_CHUNK_TILES, max_chunks=STATIC_CHUNK_CACHE_SIZE):
+        """
+        :param store: StaticTileStore holding the kinds of the tiles and their images
+        :param chunk_tiles: width and height of a chunk in tiles
+        :param max_chunks: number of chunks kept in memory, raised to the number of visible chunks if lower
+        """
+        self.store = store
+        self.chunk_tiles = chunk_tiles
+        self.chunk_size = chunk_tiles * TILE_SIZE
+        self.max_chunks = max_chunks
+
+        self.__surfaces = OrderedDict()  # (chunkx, chunky) -> baked surface, None if the chunk has no tile
+        self.__dirty = set()  # chunks to be re-baked before the next draw
+
+    def chunk_of(self, tilex, tiley):
+        return tilex // self.chunk_tiles, tiley // self.chunk_tiles
+
+    def tile_changed(self, tilex, tiley):
+        """
+        Tells the layer that the kind of the tile has changed in the store
+        :param tilex: x coordinate in tiles
+        :param tiley: y coordinate in tiles
+        :return: nothing
+        """
+        chunk = self.chunk_of(tilex, tiley)
+        if chunk in self.__surfaces:
+            self.__dirty.add(chunk)
+
+    def draw(self, surface, camera):
+        """
+        Draws the chunks visible by the camera
+        :param surface: surface to draw on
+        :param camera: camera used to transform world coordinates
+        :return: nothing
+        """
+        view = camera.get_view_rect()
+        size = self.chunk_size
+        left, top = view.left // size, view.top // size
+        right, bottom = (view.right - 1) // size, (view.bottom - 1) // size
+
+        for chunkx in range(left, right + 1):
+            for chunky in range(top, bottom + 1):
+                chunk = (chunkx, chunky)
+                if chunk in self.__dirty or chunk not in self.__surfaces:
+                    self.__bake(chunk)
+                else:
+                    self.__surfaces.move_to_end(chunk)
+                chunk_surface = self.__surfaces[chunk]
+                if chunk_surface is not None:
+                    surface.blit(chunk_surface, camera.transform_xy(chunkx * size, chunky * size))
+
+        # the visible chunks are the most recent ones and are never dropped
+        visible = (right - left + 1) * (bottom - top + 1)
+        while len(self.__surfaces) > max(self.max_chunks, visible):
+            chunk, _ = self.__surfaces.popitem(last=False)
+            self.__dirty.discard(chunk)
+
+    def __bake(self, chunk):
+        self.__dirty.discard(chunk)
+
+        grid = self.store.kinds.data
+        originx = chunk[0] * self.chunk_tiles
+        originy = chunk[1] * self.chunk_tiles
+        window = grid[max(0, originx):max(0, originx + self.chunk_tiles),
+                      max(0, originy):max(0, originy + self.chunk_tiles)]
+        xs, ys = np.nonzero(window)
+        if len(xs) == 0:
+            self.__surfaces[chunk] = None
+            return
+
+        chunk_surface = pg.Surface((self.chunk_size, self.chunk_size), pg.SRCALPHA)
+        images = self.store.images
+        # the window starts at the origin of the chunk unless the chunk is partly outside the map
+        offsetx, offsety = max(0, originx) - originx, max(0, originy) - originy
+        chunk_surface.blits([(images[kind], ((x + offsetx) * TILE_SIZE, (y + offsety) * TILE_SIZE))
+                             for x, y, kind in zip(xs.tolist(), ys.tolist(), window[xs, ys].tolist())], False)
+
+        self.__surfaces[chunk] = chunk_surface.convert_alpha()
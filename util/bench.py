@@ -0,0 +1,338 @@
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PHASES = ["events", "update", "draw", "frame"]
+PERCENTILES = [50, 90, 99]
+FOV_CHECK_RADII = [5, 10, 20, 40]
+
+# Walks around and toggles the doors nearby, each step is (frames, held keys, keys pressed once)
+DEFAULT_SCRIPT = [
+    {"frames": 60, "hold": ["RIGHT"]},
+    {"frames": 60, "hold": ["DOWN"]},
+    {"frames": 1, "press": ["RETURN"]},
+    {"frames": 60, "hold": ["LEFT"]},
+    {"frames": 60, "hold": ["UP"]},
+    {"frames": 1, "press": ["e"]},
+    {"frames": 30, "hold": ["RIGHT", "DOWN"]},
+    {"frames": 1, "press": ["RETURN"]},
+    {"frames": 30, "hold": ["LEFT", "UP"]},
+    {"frames": 1, "press": ["q"]},
+    {"frames": 30},
+]
+
+
+def print_usage():
+    print("""USAGE: python util/bench.py [--map <name> | --generate <tiles>] [--frames <n>]
+                           [--script <json file>] [--seed <n>] [--json <output file>]
+                           [--compare <json file>]
+       python util/bench.py --check-fov <observers> [--seed <n>]
+       python util/bench.py --batch-fov <observers> [--seed <n>]""")
+
+
+class HeldKeys:
+    """Stands in for pygame.key.get_pressed() with a scripted set of keys"""
+
+    def __init__(self, keys):
+        self.keys = keys
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+
+def key_code(pg, name):
+    return getattr(pg, "K_" + name)
+
+
+def generate_map(tiles, seed):
+    """Produces a map of about the given number of tiles in the internal map format"""
+    rng = random.Random(seed)
+    side = max(8, int(math.sqrt(tiles)))
+    out_map = {"objects": [], "triggers": []}
+    objects = out_map["objects"]
+    centre = side // 2
+
+    for x in range(side):
+        for y in range(side):
+            border = x in (0, side - 1) or y in (0, side - 1)
+            near_player = abs(x - centre) <= 2 and abs(y - centre) <= 2
+            roll = rng.random()
+            if border or (not near_player and roll < 0.15):
+                objects.append({"x": x, "y": y, "name": "WALL"})
+            elif near_player:
+                continue
+            elif roll < 0.17:
+                objects.append({"x": x, "y": y, "name": "DOOR",
+                                "dir": rng.choice(["up", "right", "down", "left"])})
+            elif roll < 0.19:
+                objects.append({"x": x, "y": y, "name": "APPLE"})
+
+    objects.append({"x": centre, "y": centre, "name": "PLAYER"})
+
+    for i in range(side // 8):
+        out_map["triggers"].append({"x": rng.randrange(side) * 32, "y": rng.randrange(side) * 32,
+                                    "width": 96, "height": 96, "text": "Trigger " + str(i)})
+
+    return out_map
+
+
+def load_script(filename):
+    if filename is None:
+        return DEFAULT_SCRIPT
+    with open(filename, 'rt') as f:
+        return json.loads(f.read())
+
+
+def expand_script(pg, script, frames):
+    """Produces (held keys, pressed keys) per frame, repeating the script until frames are filled"""
+    steps = []
+    for step in script:
+        held = {key_code(pg, name) for name in step.get("hold", [])}
+        pressed = [key_code(pg, name) for name in step.get("press", [])]
+        steps.append((held, pressed))
+        steps.extend((held, []) for i in range(step.get("frames", 1) - 1))
+
+    return [steps[i % len(steps)] for i in range(frames)]
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(math.ceil(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(timings):
+    summary = {}
+    for phase in PHASES:
+        values = timings[phase]
+        summary[phase] = {"mean": sum(values) / len(values), "max": max(values)}
+        for p in PERCENTILES:
+            summary[phase]["p" + str(p)] = percentile(values, p)
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(map_name, generate, frames, script, seed):
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    os.chdir(ROOT)
+
+    import pygame as pg
+    from game.game import Game
+    from game.map import Map
+    from game.settings import SCREEN_WIDTH, SCREEN_HEIGHT, SIM_RATE
+
+    pg.init()
+    display = pg.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    game = Game(display)
+
+    start = time.perf_counter()
+    if generate:
+        with tempfile.NamedTemporaryFile('wt', suffix='.json', delete=False) as f:
+            f.write(json.dumps(generate_map(generate, seed)))
+        try:
+            game.load_map(Map(f.name))
+        finally:
+            os.remove(f.name)
+    else:
+        game.load(map_name)
+    load_time = time.perf_counter() - start
+
+    timings = {phase: [] for phase in PHASES}
+    dt = 1 / SIM_RATE
+    for held, pressed in expand_script(pg, script, frames):
+        for key in pressed:
+            pg.event.post(pg.event.Event(pg.KEYDOWN, key=key))
+        # the text box would otherwise pile up and hide the map
+        game.text_queue.clear()
+        game.__dt__ = dt
+
+        t0 = time.perf_counter()
+        game.__events__()
+        game.keys_pressed = HeldKeys(held)
+        t1 = time.perf_counter()
+        game.__update__()
+        t2 = time.perf_counter()
+        game.__draw__()
+        t3 = time.perf_counter()
+
+        timings["events"].append((t1 - t0) * 1000)
+        timings["update"].append((t2 - t1) * 1000)
+        timings["draw"].append((t3 - t2) * 1000)
+        timings["frame"].append((t3 - t0) * 1000)
+
+    pg.quit()
+
+    return {
+        "commit": git_commit(),
+        "map": "generated:" + str(generate) if generate else map_name,
+        "seed": seed,
+        "frames": frames,
+        "load_ms": load_time * 1000,
+        "python": platform.python_version(),
+        "pygame": pg.version.ver,
+        "summary": summarize(timings),
+    }
+
+
+def check_fov(observers, seed):
+    """
+    Compares the table shadowcasting with calc_fov on random maps and times both
+    :param observers: number of random observers per radius
+    :param seed: random seed
+    :return: true if every observer sees the same tiles
+    """
+    import numpy as np
+    from game.grid import TileGrid
+    from ui.fov import calc_fov, shadowcast_table
+
+    rng = random.Random(seed)
+    same = True
+    print("{:<8}{:>12}{:>12}{:>10}".format("radius", "calc_fov ms", "table ms", "speedup"))
+    for radius in FOV_CHECK_RADII:
+        side = 4 * radius
+        visibility = [[rng.random() > 0.2 for _ in range(side)] for _ in range(side)]
+        for i in range(side):
+            visibility[i][0] = visibility[i][side - 1] = visibility[0][i] = visibility[side - 1][i] = False
+        grid = TileGrid(side, side)
+        grid.data[:] = visibility
+        table = shadowcast_table(radius)
+
+        reference_time = table_time = 0.0
+        for _ in range(observers):
+            # calc_fov wraps around the map edges, keep the radius window inside the map
+            x, y = rng.randrange(radius, side - radius), rng.randrange(radius, side - radius)
+            if not visibility[x][y]:
+                continue
+            fov_data = [[False] * side for _ in range(side)]
+
+            start = time.perf_counter()
+            calc_fov(x, y, radius, visibility, fov_data)
+            reference_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            octants = table.cast(grid, x, y)
+            table_time += time.perf_counter() - start
+
+            lit = np.zeros((side, side), dtype=np.bool_)
+            lit[x, y] = True
+            for xs, ys in octants:
+                lit[xs, ys] = True
+            if lit.tolist() != fov_data:
+                print("mismatch at radius {} observer {}".format(radius, (x, y)))
+                same = False
+
+        print("{:<8}{:>12.3f}{:>12.3f}{:>9.1f}x".format(
+            radius, reference_time * 1000 / observers, table_time * 1000 / observers,
+            reference_time / max(table_time, 1e-9)))
+    return same
+
+
+def bench_batch_fov(observers, seed):
+    """
+    Times a batch of observers in the calling process and in the process pool
+    :param observers: number of observers
+    :param seed: random seed
+    :return: true if both give the same tiles
+    """
+    import numpy as np
+    from game.grid import TileGrid
+    from game.settings import FOV_RADIUS
+    from ui.fov_batch import FovPool, batch_fov
+
+    rng = random.Random(seed)
+    side = 256
+    grid = TileGrid(side, side)
+    grid.data[:] = np.array([[rng.random() > 0.2 for _ in range(side)] for _ in range(side)])
+    batch = [(rng.randrange(side), rng.randrange(side), FOV_RADIUS) for _ in range(observers)]
+
+    start = time.perf_counter()
+    inline = batch_fov(grid, batch)
+    inline_time = time.perf_counter() - start
+
+    pool = FovPool(threshold=0)
+    try:
+        pool.compute(grid, batch[:1], 0)  # starts the processes
+        start = time.perf_counter()
+        pooled = pool.compute(grid, batch, 0)
+        pool_time = time.perf_counter() - start
+    finally:
+        pool.close()
+
+    print("{} observers  inline {:.1f} ms  pool of {} {:.1f} ms".format(
+        observers, inline_time * 1000, pool.workers, pool_time * 1000))
+    return all(a.bits == b.bits and (a.left, a.top) == (b.left, b.top) for a, b in zip(inline, pooled))
+
+
+def print_report(result, baseline=None):
+    print("commit {}  map {}  frames {}  load {:.1f} ms".format(
+        result["commit"], result["map"], result["frames"], result["load_ms"]))
+    columns = ["mean"] + ["p" + str(p) for p in PERCENTILES] + ["max"]
+    print("{:<8}".format("ms") + "".join("{:>10}".format(c) for c in columns))
+    for phase in PHASES:
+        row = result["summary"][phase]
+        line = "{:<8}".format(phase) + "".join("{:>10.3f}".format(row[c]) for c in columns)
+        if baseline is not None:
+            base = baseline["summary"][phase]["p50"]
+            if base > 0:
+                line += "   p50 {:+.1f}% vs {}".format((row["p50"] / base - 1) * 100, baseline["commit"])
+        print(line)
+
+
+def main():
+    args = sys.argv[1:]
+    options = {"--map": "map1", "--generate": None, "--frames": "600", "--script": None,
+               "--seed": "0", "--json": None, "--compare": None, "--check-fov": None,
+               "--batch-fov": None}
+    while args:
+        name = args.pop(0)
+        if name not in options or not args:
+            print_usage()
+            return
+        options[name] = args.pop(0)
+
+    if options["--batch-fov"]:
+        if not bench_batch_fov(int(options["--batch-fov"]), int(options["--seed"])):
+            print("pool results differ")
+            sys.exit(1)
+        return
+
+    if options["--check-fov"]:
+        if not check_fov(int(options["--check-fov"]), int(options["--seed"])):
+            sys.exit(1)
+        return
+
+    generate = int(options["--generate"]) if options["--generate"] else None
+    result = run(options["--map"], generate, int(options["--frames"]),
+                 load_script(options["--script"]), int(options["--seed"]))
+
+    baseline = None
+    if options["--compare"]:
+        with open(options["--compare"], 'rt') as f:
+            baseline = json.loads(f.read())
+
+    print_report(result, baseline)
+
+    if options["--json"]:
+        with open(options["--json"], 'wt') as f:
+            f.write(json.dumps(result, sort_keys=True, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,13 @@
 import sys, json
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+from game.binmap import EXTENSION, write_map
 TILE_SIZE = 32
 
 def print_usage():
-    print("""USAGE: python tiled2json.py <input json tiled file> <output json file>""")
+    print("""USAGE: python tiled2json.py <input json tiled file> <output json file>
+       the output is written in the binary map format if its name ends with """ + EXTENSION)
 
 
 def move_to_visible_area(out_map):
@@ -79,6 +84,10 @@ def main():
 
     move_to_visible_area(out_map)
 
+    if out_file.endswith(EXTENSION):
+        write_map(out_file, out_map)
+        return
+
     with open(out_file, 'wt') as f:
         f.write(json.dumps(out_map, sort_keys=True, indent=4))
 
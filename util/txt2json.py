@@ -1,8 +1,13 @@
 import sys, json
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+from game.binmap import EXTENSION, write_map
 
 
 def print_usage():
-    print("""USAGE: python txt2json.py <input txt file> <output json file>""")
+    print("""USAGE: python txt2json.py <input txt file> <output json file>
+       the output is written in the binary map format if its name ends with """ + EXTENSION)
 
 
 def main():
@@ -27,6 +32,10 @@ def main():
             elif tile == 'P': \
                 out_map.append({"x": col, "y": row, "name": "PLAYER"})
 
+    if out_file.endswith(EXTENSION):
+        write_map(out_file, {"objects": out_map, "triggers": []})
+        return
+
     with open(out_file, 'wt') as f:
         f.write(json.dumps(out_map, sort_keys=True, indent=4))
 